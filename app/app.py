@@ -20,6 +20,8 @@ YEAR = 2025
 init_holdings = FinLoad.load_init_holdings(data_path_o, YEAR)
 df_year_cashflow = FinLoad.load_cashflow(data_path_o, YEAR)
 df_year_investments = FinLoad.load_investments(data_path_o, YEAR)
+# one split of the ledger per month, the dropdown callback only looks them up
+df_months_cashflow = dict(tuple(df_year_cashflow.groupby(df_year_cashflow.index.month)))
 
 df_m_cashflow = FinCalc.calc_monthly_cashflow(df_year_cashflow, init_holdings, YEAR).round(2)
 row_today_cashflow = FinCalc.calc_curr_month_cashflow(df_year_cashflow, df_m_cashflow).round(2)
@@ -86,7 +88,7 @@ app.layout = html.Div(
     Input('month-expenses-combobox', 'value')
 )
 def update_plot_month_expenses(selected_month):
-    df_expenses = FinCalc.calc_expenses(df_year_cashflow[ df_year_cashflow.index.month == selected_month ])
+    df_expenses = FinCalc.calc_expenses(df_months_cashflow.get(selected_month, df_year_cashflow.iloc[0:0]))
     df_expenses["Qty"] = df_expenses.Qty.abs() # sunburst does not understand negative values
     fig_expenses_donut = FinPlot.plot_expenses_donut(df_expenses)
 
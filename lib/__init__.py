@@ -1,7 +1,20 @@
-from .fin_cashflow import FinCashflow
-from .fin_investments import FinInvestments
+from .fin_cashflow import FinCashflow, load_cashflow_years
+from .fin_stream import FinCashflowStream
+from .fin_investments import FinInvestments, load_investments_years
+from .fin_chain import FinChain
+from .fin_snapshot import YearSnapshot, load_year_results
+from .fin_sqlite import LedgerDB
+from .fin_import import FinImport
+from .fin_categorize import FinCategorizer
+from .fin_fx import FinFX
+from .fin_query import LedgerIndex
+from .fin_budget import FinBudget
+from .fin_recurring import FinRecurring
+from .fin_anomaly import FinAnomaly
+from .fin_scenario import FinScenario, compare_scenarios
+from .fin_arrow import export_arrow, import_arrow, read_arrow_table
 from .plotlib import FinPlot
 from .logger import Logger
 
 
-__all__ = ["FinCashflow", "FinInvestments", "FinPlot", "Logger"]
\ No newline at end of file
+__all__ = ["FinCashflow", "FinCashflowStream", "FinInvestments", "load_cashflow_years", "load_investments_years", "FinChain", "YearSnapshot", "load_year_results", "LedgerDB", "FinImport", "FinCategorizer", "FinFX", "LedgerIndex", "FinBudget", "FinRecurring", "FinAnomaly", "FinScenario", "compare_scenarios", "export_arrow", "import_arrow", "read_arrow_table", "FinPlot", "Logger"]
\ No newline at end of file
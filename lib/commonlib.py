@@ -1,12 +1,20 @@
 from datetime import datetime, timedelta
+import pandas as pd
 
 def last_day_of_previous_month(date):
     first_day_of_current_month = date.replace(day=1)
     last_day_of_prev_month = first_day_of_current_month - timedelta(days=1)
     return last_day_of_prev_month
 
-def define_end_date(YEAR: int):
-    today = datetime.now()
+# The date computations are evaluated at: as_of (a date or a date string)
+# when given, otherwise the wall clock, read once by the caller
+def resolve_as_of(as_of = None):
+    if as_of is None:
+        return datetime.now()
+    return pd.Timestamp(as_of).to_pydatetime()
+
+def define_end_date(YEAR: int, as_of = None):
+    today = resolve_as_of(as_of)
     #today_strf = today.strftime('%Y-%m-%d')
     if today.year > YEAR: # full year of a past year
         end_date = f"{YEAR}-12-31"
@@ -15,8 +23,8 @@ def define_end_date(YEAR: int):
         end_date = last_day_of_previous_month(today).strftime('%Y-%m-%d')
     return end_date
 
-def define_today_date():
-    today = datetime.now()
+def define_today_date(as_of = None):
+    today = resolve_as_of(as_of)
     today_date_str = today.strftime("%Y-%m-%d")
     today_month_str = today.strftime("%Y-%m")
 
@@ -31,8 +39,19 @@ def define_prev_month_holdings(df_m_cashflow):
 
 # ------------------ LOAD DATA -------------------------
 from pathlib import Path
-import pandas as pd
+import numpy as np
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from .logger import Logger
+from .errors import TypeDataError
+from .fin_cache import LedgerCache, file_fingerprint
+
+try:
+    import pyarrow
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
 
 def load_init_holdings(path : Path, YEAR : int):
     try:
@@ -44,32 +63,488 @@ def load_init_holdings(path : Path, YEAR : int):
         print(e)
         return None
 
-def load_data(typedata : str, path : Path, YEAR : int):
+# Years with a {YEAR} data folder under path, in ascending order
+def list_years(path : Path):
+    return sorted(int(p.name) for p in Path(path).iterdir() if p.is_dir() and p.name.isdigit())
+
+# Declared column types of the month CSV files, label columns are categorical
+LEDGER_SCHEMAS = {
+    "cashflow": {
+        "Type": "category",
+        "Qty": "float64",
+        "Coin": "category",
+        "Category": "category",
+        "Subcategory": "category",
+        "Description": "object",
+    },
+    "investments": {
+        "Type": "category",
+        "Symbol": "category",
+        "Qty": "float64",
+        "Category": "category",
+        "Subcategory": "category",
+        "Description": "object",
+    },
+}
+
+# Strips whitespace on the categories instead of the rows, O(unique labels)
+def strip_categories(column : pd.Series):
+    categories = column.cat.categories.str.strip()
+    if categories.is_unique:
+        return column.cat.rename_categories(categories)
+    # "Food" and "Food " collapse into the same category
+    uniques = categories.unique()
+    codes = np.where(column.cat.codes >= 0, uniques.get_indexer(categories)[column.cat.codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, uniques), index=column.index, name=column.name)
+
+# read_csv options for a month file, dtypes are matched against the raw
+# header names, which may be padded with whitespace
+def month_csv_options(typedata : str, filepath : str, engine : str = None):
+    engine = engine or CSV_ENGINE
+    schema = LEDGER_SCHEMAS[typedata]
+    with open(filepath) as file:
+        raw_columns = file.readline().rstrip("\r\n").split(",")
+    if engine != "pyarrow": # skipinitialspace also applies to the header
+        raw_columns = [raw.lstrip() for raw in raw_columns]
+    dtype = {raw: schema[raw.strip()] for raw in raw_columns if raw.strip() in schema}
+    parse_dates = [raw for raw in raw_columns if raw.strip() == "Date"]
+
+    if engine == "pyarrow":
+        return dict(engine="pyarrow", dtype=dtype, parse_dates=parse_dates, keep_default_na=False, na_values=[])
+    return dict(skipinitialspace=True, na_filter=False, dtype=dtype, parse_dates=parse_dates)
+
+def normalize_month_data(typedata : str, df : pd.DataFrame):
+    df.columns = df.columns.str.strip() # remove whitespaces from columns
+    if df.empty: # header only month, skipped by the loaders
+        return df
+
+    for column, column_type in LEDGER_SCHEMAS[typedata].items():
+        if column_type == "category" and column in df.columns:
+            df[column] = strip_categories(df[column])
+    if "Description" in df.columns:
+        df["Description"] = df["Description"].str.strip()
+    if not pd.api.types.is_datetime64_any_dtype(df['Date']): # padded dates with the C engine
+        df['Date'] = pd.to_datetime(df['Date'].str.strip())
+    return df
+
+def read_month_data(typedata : str, filepath : str):
+    df = pd.read_csv(filepath, **month_csv_options(typedata, filepath))
+    return normalize_month_data(typedata, df)
+
+# Yields the month file in normalized chunks of `chunksize` rows. The pyarrow
+# engine cannot read in chunks, so the C engine is always used here.
+def read_month_chunks(typedata : str, filepath : str, chunksize : int):
+    with pd.read_csv(filepath, chunksize=chunksize, **month_csv_options(typedata, filepath, engine="c")) as reader:
+        for chunk in reader:
+            yield normalize_month_data(typedata, chunk)
+
+# Concatenates ledger frames keeping label columns categorical: pd.concat falls
+# back to object dtype when the frames have different category sets.
+def concat_ledgers(dfl):
+    dtypes = dict()
+    for column in {c for df in dfl for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)}:
+        categories = pd.Index([], dtype=object)
+        for df in dfl:
+            if column in df.columns:
+                values = df[column].cat.categories if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column].unique()
+                categories = categories.union(values)
+        dtypes[column] = pd.CategoricalDtype(categories)
+
+    dfl = [df.astype({c: t for c, t in dtypes.items() if c in df.columns}) for df in dfl]
+    return pd.concat(dfl)
+
+def read_month_data_safe(typedata : str, filepath : str, month : int):
+    try:
+        return read_month_data(typedata, filepath).assign(_month=month)
+    except Exception as e:
+        print(e)
+        return None
+
+# Loads the month files of several years at once. Months served by the ledger
+# cache are resolved first, the remaining files are parsed on a thread pool of
+# `workers` threads and everything is concatenated once in (year, month) order.
+def load_data_years(typedata : str, path : Path, years, use_cache : bool = False, workers : int = 1):
     if typedata not in ["cashflow", "investments"]:
         raise TypeDataError(f"Type data is not either cashflow or investments")
-    else:
-        basepath = f"{path}/{YEAR}/{typedata}/"
-        dfl = list()
+
+    months = dict() # (YEAR, month) -> parsed frame
+    to_parse = list() # (YEAR, month, filepath)
+    caches = dict() # YEAR -> (cache, old manifest, new manifest)
+    for YEAR in years:
+        if use_cache:
+            cache = LedgerCache(typedata, path, YEAR)
+            manifest, df_cached = cache.load()
+            cached_months = cache.split_months(df_cached) if df_cached is not None else dict()
+            caches[YEAR] = (cache, manifest, dict())
+
         for i in range(1,13):
-            try:
-                filepath = f"{path}/{YEAR}/{typedata}/{YEAR}-{i:0=2}_{typedata}.csv"
-                df = pd.read_csv(filepath, skipinitialspace=True, na_filter=False)
-                df.columns = df.columns.str.strip() # remove whitespaces from columns
-                df.Category = df.Category.str.strip()
-                df.Subcategory = df.Subcategory.str.strip()
-                df.Type = df.Type.str.strip()
-                if typedata == "cashflow":
-                    df.Coin = df.Coin.str.strip()
-                elif typedata == "investments":
-                    df.Symbol = df.Symbol.str.strip()
-
-                if not(df.empty):
-                    dfl.append(df)
-            except Exception as e:
-                print(e)
-                continue
-
-        df_year = pd.concat(dfl)
-        df_year['Date'] = pd.to_datetime(df_year['Date'])
-        df_year.set_index('Date',inplace=True)
-        return df_year
\ No newline at end of file
+            filename = f"{YEAR}-{i:0=2}_{typedata}.csv"
+            filepath = f"{path}/{YEAR}/{typedata}/{filename}"
+            if use_cache:
+                try:
+                    fingerprint = [filename] + file_fingerprint(filepath)
+                except Exception as e:
+                    print(e)
+                    continue
+                caches[YEAR][2][str(i)] = fingerprint
+                if manifest.get(str(i)) == fingerprint and i in cached_months:
+                    months[(YEAR, i)] = cached_months[i]
+                    continue
+                Logger.info(f"Parsing modified month file {filepath}")
+            to_parse.append((YEAR, i, filepath))
+
+    read_task = lambda task: read_month_data_safe(typedata, task[2], task[1])
+    if workers > 1 and len(to_parse) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(read_task, to_parse))
+    else:
+        parsed = [read_task(task) for task in to_parse]
+
+    for (YEAR, i, filepath), df in zip(to_parse, parsed):
+        if df is not None:
+            months[(YEAR, i)] = df
+        elif use_cache:
+            del caches[YEAR][2][str(i)] # never validate a month that failed to parse
+
+    dfl = list()
+    for YEAR in years:
+        dfl_year = [months[(YEAR, i)] for i in range(1,13) if (YEAR, i) in months and not(months[(YEAR, i)].empty)]
+        if use_cache:
+            cache, manifest, new_manifest = caches[YEAR]
+            if new_manifest != manifest and dfl_year:
+                cache.save(new_manifest, concat_ledgers(dfl_year))
+        dfl.extend(dfl_year)
+
+    df_years = concat_ledgers(dfl).drop(columns="_month")
+    df_years.set_index('Date',inplace=True)
+    return df_years
+
+def load_data(typedata : str, path : Path, YEAR : int, use_cache : bool = False, workers : int = 1):
+    return load_data_years(typedata, path, [YEAR], use_cache, workers)
+
+# Row range [start, stop) of every year in a date sorted ledger
+def year_bounds(index : pd.DatetimeIndex, years):
+    starts = index.searchsorted([pd.Timestamp(YEAR, 1, 1) for YEAR in years])
+    stops = index.searchsorted([pd.Timestamp(YEAR + 1, 1, 1) for YEAR in years])
+    return {YEAR: (int(start), int(stop)) for YEAR, start, stop in zip(years, starts, stops)}
+
+# Date sorted ledger of several years (all years under path by default) built
+# in a single load. attrs["year_bounds"] marks where every year starts and stops.
+def load_ledger(typedata : str, path : Path, years = None, use_cache : bool = False, workers : int = 1):
+    years = list_years(path) if years is None else sorted(years)
+    df_ledger = load_data_years(typedata, path, years, use_cache, workers)
+    df_ledger = df_ledger.sort_index(kind="stable")
+    df_ledger.attrs["year_bounds"] = year_bounds(df_ledger.index, years)
+    return df_ledger
+
+# One year of a multi-year ledger, as a positional slice
+def ledger_year(df_ledger : pd.DataFrame, YEAR : int):
+    bounds = df_ledger.attrs.get("year_bounds", dict())
+    if YEAR not in bounds:
+        bounds = year_bounds(df_ledger.index, [YEAR])
+    start, stop = bounds[YEAR]
+    df_year = df_ledger.iloc[start:stop]
+    df_year.attrs = dict()
+    return df_year
+
+
+# ------------------ CASHFLOW TABLES -------------------------
+# Shared by the in-memory and the streaming cashflow engines, which only
+# differ in how the per-month totals are obtained.
+
+# Exact money arithmetic: amounts as int64 cents, floats only for presentation
+CENTS = 100
+
+def to_cents(qty):
+    if np.ndim(qty) == 0:
+        return int(np.rint(float(qty) * CENTS))
+    return np.rint(np.asarray(qty, dtype='float64') * CENTS).astype('int64')
+
+def from_cents(cents):
+    return cents / CENTS
+
+# Ledger with an int64 Cents column next to Qty, aggregated instead of Qty in exact mode
+def add_cents(df : pd.DataFrame):
+    return df.assign(Cents=to_cents(df["Qty"].values))
+
+FLOWS = ["incomes", "liabilities", "investments"]
+
+# Columns of df_m_cashflow and df_last_month_cashflow, the init row holds NaN flows
+CASHFLOW_SCHEMA = {
+    "incomes": 'float64',
+    "liabilities": 'float64',
+    "savings": 'float64',
+    "saving_rate": 'float64',
+    "investments": 'float64',
+    "liquidity": 'float64',
+}
+
+# Flow of every transaction as a categorical, NaN for the transfers that are not investments
+def classify_flows(df : pd.DataFrame):
+    qty = df["Qty"].values
+    not_transfer = (df["Category"] != "Transfer").values
+    invest = ~not_transfer & (df["Subcategory"] == "Invest").values
+    codes = np.select([not_transfer & (qty > 0), not_transfer & (qty <= 0), invest], [0, 1, 2], -1)
+    return pd.Categorical.from_codes(codes, categories=FLOWS)
+
+# Totals of every flow per period of freq, in one grouped aggregation of the ledger
+def flow_totals(df : pd.DataFrame, amount : str = "Qty", freq : str = 'D'):
+    flows = classify_flows(df)
+    amounts = pd.Series(df[amount].values, index=df.index)
+    df_totals = amounts.groupby([pd.Grouper(freq=freq), flows], observed=False).sum().unstack()
+    return df_totals.reindex(columns=FLOWS, fill_value=0)
+
+# Table from per-period totals (month ends by default), plus the init row of the previous year.
+# Only complete periods are kept: the last row is the last period ending on or before end_date,
+# e.g. with end_date 2025-01-31 a 'QE' table has no 2025-03-31 row holding January alone.
+# With cents=True the totals are int64 cents, summed exactly and converted last.
+def build_monthly_cashflow(m_incomes : pd.Series, m_liab : pd.Series, m_investments : pd.Series, init_holdings, YEAR : int, end_date : str, cents : bool = False, freq : str = 'ME'):
+    # if in a period no transactions happen, then add a row of that period filled with zero
+    offset = pd.tseries.frequencies.to_offset(freq)
+    complete_index = pd.date_range(
+        start=offset.rollforward(pd.Timestamp(f"{YEAR}-01-01")), end=offset.rollback(pd.Timestamp(end_date)), freq=freq
+    )
+    m_incomes = m_incomes.reindex(complete_index, fill_value=0)
+    m_liab = m_liab.reindex(complete_index, fill_value=0)
+    m_investments = m_investments.reindex(complete_index, fill_value=0)
+    m_savings = m_incomes + m_liab
+
+    # Calculate cumulative savings + init
+    init_liquidity = 0
+    for cc, val in init_holdings['liquidity_eur'].items():
+        init_liquidity += to_cents(val) if cents else val
+    liquidity = np.concatenate([[init_liquidity], m_savings.values]).cumsum() - np.concatenate([[0], np.abs(m_investments.values)]).cumsum()
+
+    if cents:
+        m_incomes, m_liab, m_savings, m_investments = (from_cents(m) for m in (m_incomes, m_liab, m_savings, m_investments))
+        init_liquidity, liquidity = from_cents(init_liquidity), from_cents(liquidity)
+
+    df_m_cashflow = pd.DataFrame(index=complete_index, dtype='float64')
+    df_m_cashflow["incomes"] = m_incomes.astype('float64')
+    df_m_cashflow["liabilities"] = m_liab.astype('float64')
+    df_m_cashflow["savings"] = m_savings.astype('float64')
+    df_m_cashflow["saving_rate"] = (df_m_cashflow["savings"] / df_m_cashflow["incomes"]).where(df_m_cashflow["incomes"] != 0, 0.0)
+    df_m_cashflow["investments"] = m_investments.astype('float64')
+
+    # opening balance as savings and liquidity, no flows: NaN keeps the table float64
+    init_row = pd.DataFrame({
+        "incomes": [np.nan],
+        "liabilities": [np.nan],
+        "savings": [init_liquidity],
+        "saving_rate": [np.nan],
+        "investments": [0.0]
+    }, index=[datetime(YEAR-1, 12, 31)], dtype='float64')
+
+    df_monthly_cashflow = pd.concat([init_row, df_m_cashflow])
+    df_monthly_cashflow['liquidity'] = liquidity
+    return df_monthly_cashflow.astype(CASHFLOW_SCHEMA)
+
+# One row table of the current month, on top of the last monthly row.
+# With cents=True the month totals are int64 cents.
+def build_curr_month_cashflow(m_incomes : float, m_liab : float, m_investments : float, df_m_cashflow : pd.DataFrame, today : datetime, cents : bool = False):
+    prev_month_liquidity, prev_month_investments = define_prev_month_holdings(df_m_cashflow)
+    if cents:
+        prev_month_liquidity, prev_month_investments = to_cents(prev_month_liquidity), to_cents(prev_month_investments)
+    m_savings = m_incomes + m_liab
+    try:
+        m_savingrate  = float(m_savings / m_incomes     )
+    except ZeroDivisionError:
+        m_savingrate = 0.0
+
+    investments = prev_month_investments + m_investments
+    liquidity = prev_month_liquidity + m_savings - abs(m_investments)
+    if cents:
+        m_incomes, m_liab, m_savings, investments, liquidity = (float(from_cents(m)) for m in (m_incomes, m_liab, m_savings, investments, liquidity))
+
+    row_today_cashflow = pd.DataFrame({
+        "incomes": [m_incomes],
+        "liabilities": [m_liab],
+        "savings": [m_savings],
+        "saving_rate": [m_savingrate],
+        "investments": [investments],
+        "liquidity": [liquidity]
+    }, index=[datetime(today.year, today.month, today.day)])
+
+    return row_today_cashflow.astype(CASHFLOW_SCHEMA)
+
+# Account balances from the per-account sums of the ledger, int64 cents with cents=True
+def build_balances(account_sums : pd.Series, init_holdings, cents : bool = False):
+    balances = dict()
+    for cc, val in account_sums.items():
+        init = init_holdings['liquidity_eur'].get(cc, 0)
+        if cents:
+            val = from_cents(int(val) + to_cents(init))
+        else:
+            val = val + init
+        balances[cc] = round(float(val), 2)
+    return balances
+
+# Sum of the transactions of every day (rows) and account (columns)
+def daily_account_sums(df : pd.DataFrame, amount : str = "Qty"):
+    return df.groupby([df.index.normalize(), "Type"], observed=True)[amount].sum().unstack("Type", fill_value=0)
+
+# Running balance of every account at the end of each day with transactions,
+# one grouped cumsum seeded with the init liquidity, which is the first row
+# dated the last day of the previous year
+def build_balance_timeline(df : pd.DataFrame, init_holdings, YEAR : int, cents : bool = False):
+    df_daily = daily_account_sums(df, "Cents" if cents else "Qty")
+    accounts = list(df_daily.columns) + [cc for cc in init_holdings['liquidity_eur'] if cc not in df_daily.columns]
+    df_daily = df_daily.reindex(columns=pd.Index(accounts, name="Type"), fill_value=0)
+
+    seeds = [init_holdings['liquidity_eur'].get(cc, 0) for cc in accounts]
+    init_row = pd.DataFrame([to_cents(seeds) if cents else seeds], columns=df_daily.columns, index=[datetime(YEAR-1, 12, 31)])
+    df_timeline = pd.concat([init_row, df_daily]).cumsum()
+    df_timeline.index.name = "Date"
+    return from_cents(df_timeline) if cents else df_timeline.astype('float64')
+
+# Balances at the end of date, of all accounts (dict) or of one account
+def balance_as_of(df_timeline : pd.DataFrame, date, account : str = None):
+    pos = df_timeline.index.searchsorted(pd.Timestamp(date).normalize(), side='right') - 1
+    if pos < 0:
+        raise ValueError(f"{date} is before the opening balances of {df_timeline.index[0].date()}")
+    balances = df_timeline.iloc[pos]
+    if account is not None:
+        return round(float(balances[account]), 2)
+    return {cc: round(float(val), 2) for cc, val in balances.items()}
+
+# Monthly liquidity, investments and net worth, same columns as FinCalc.calc_global_nw
+def build_net_worth(df_m_cashflow : pd.DataFrame, df_year_holdings : pd.DataFrame):
+    investments = df_year_holdings['Total'] if not df_year_holdings.empty else pd.Series(0.0, index=df_m_cashflow.index)
+    nw = pd.concat([df_m_cashflow['liquidity'], investments], axis=1, keys=['liquidity', 'investments'])
+    nw['networth'] = nw.liquidity + nw.investments
+    nw["nwch"] = (nw.networth - nw.networth.shift(1) )
+    nw["ch%"] = (nw.networth - nw.networth.shift(1) )/ nw.networth
+    return nw
+
+
+# ------------------ EXPENSES ROLLUP -------------------------
+
+# Expenses (positive amounts) and number of transactions per
+# (Year, Month, Category, Subcategory), from the rows that are not transfers
+def build_expense_cube(df : pd.DataFrame, cents : bool = False):
+    amount = "Cents" if cents else "Qty"
+    df_expenses = df.loc[(df["Category"] != "Transfer") & (df["Qty"] < 0)]
+    keys = [df_expenses.index.year.rename("Year"), df_expenses.index.month.rename("Month"), "Category", "Subcategory"]
+    df_cube = df_expenses.groupby(keys, observed=True)[amount].agg(["sum", "count"])
+    expenses = -df_cube["sum"]
+    return pd.DataFrame({
+        "Qty": from_cents(expenses) if cents else expenses,
+        "Count": df_cube["count"],
+    })
+
+# Category/Subcategory rows of one month, or of the whole year when month is None
+def expense_breakdown(df_cube : pd.DataFrame, YEAR : int, month : int = None):
+    if YEAR not in df_cube.index.get_level_values("Year"):
+        return pd.DataFrame(columns=["Category", "Subcategory", "Qty", "Count"])
+    df_year = df_cube.xs(YEAR, level="Year")
+    if month is None:
+        df_selected = df_year.groupby(level=["Category", "Subcategory"], observed=True).sum()
+    elif month in df_year.index.get_level_values("Month"):
+        df_selected = df_year.xs(month, level="Month")
+    else:
+        df_selected = df_year.iloc[0:0].droplevel("Month")
+    return df_selected.reset_index()
+
+# Months (rows) by label of level (columns) of the expenses of a year
+def expense_trend(df_cube : pd.DataFrame, YEAR : int, level : str = "Category"):
+    df_year = df_cube.xs(YEAR, level="Year") if YEAR in df_cube.index.get_level_values("Year") else df_cube.iloc[0:0].droplevel("Year")
+    df_trend = df_year.groupby(level=["Month", level], observed=True)["Qty"].sum().unstack(level, fill_value=0.0)
+    df_trend.index = pd.to_datetime([f"{YEAR}-{month:0=2}-01" for month in df_trend.index]) + pd.offsets.MonthEnd(0)
+    return df_trend
+
+
+# ------------------ HOLDINGS -------------------------
+
+# Month end Qty and CumQty of every (Type, Symbol) over complete_index, all
+# symbols in one pass: columns (Type, Symbol, Qty|CumQty), symbols grouped by
+# asset class in order of appearance. Rows outside complete_index are left out.
+def build_holdings_monthlyized(df : pd.DataFrame, complete_index : pd.DatetimeIndex):
+    df_keys = pd.DataFrame({"Type": df["Type"].astype(object).values, "Symbol": df["Symbol"].astype(object).values})
+    keys = pd.MultiIndex.from_frame(df_keys)
+    symbols = keys.unique()
+    class_rank = pd.Index(df_keys["Type"].unique()).get_indexer(symbols.get_level_values(0))
+    symbols = symbols[np.argsort(class_rank, kind='stable')]
+
+    months = pd.DatetimeIndex(df.index.values.astype('datetime64[M]')) + pd.offsets.MonthEnd(0)
+    rows = complete_index.get_indexer(months)
+    cols = symbols.get_indexer(keys)
+    inside = (rows >= 0) & (cols >= 0)
+    qty = np.nan_to_num(df["Qty"].values.astype('float64'))
+    m_qty = np.bincount(
+        rows[inside] * len(symbols) + cols[inside], weights=qty[inside], minlength=len(complete_index) * len(symbols)
+    ).reshape(len(complete_index), len(symbols))
+
+    values = np.stack([m_qty, m_qty.cumsum(axis=0)], axis=2).reshape(len(complete_index), 2 * len(symbols))
+    columns = pd.MultiIndex.from_tuples(
+        [(asset_class, symbol, field) for asset_class, symbol in symbols for field in ("Qty", "CumQty")],
+        names=["Type", "Symbol", None]
+    )
+    return pd.DataFrame(values, index=complete_index, columns=columns)
+
+# {asset class: {symbol: Qty/CumQty frame}}, the layout of the per-symbol loops
+def holdings_dict(df_holdings : pd.DataFrame):
+    holdings = dict()
+    values = df_holdings.values
+    for i, (asset_class, symbol) in enumerate(df_holdings.columns.droplevel(2)[::2]):
+        holdings.setdefault(asset_class, dict())[symbol] = pd.DataFrame(
+            values[:, 2*i:2*i+2], index=df_holdings.index, columns=["Qty", "CumQty"]
+        )
+    return holdings
+
+
+# ------------------ INCREMENTAL UPDATES -------------------------
+# Effect of new transactions on tables computed before, so that appending
+# rows costs O(affected periods) instead of a reload of the ledger. The
+# functions return new tables and leave their inputs untouched.
+
+# Date-indexed ledger frame with the load_data schema, from a list of dicts or a frame
+def ledger_rows(typedata : str, rows):
+    if isinstance(rows, pd.DataFrame) and "Date" not in rows.columns:
+        rows = rows.reset_index()
+    df = pd.DataFrame(rows).copy()
+    df["Date"] = pd.to_datetime(df["Date"])
+    df = df.astype({column: column_type for column, column_type in LEDGER_SCHEMAS[typedata].items() if column in df.columns})
+    return normalize_month_data(typedata, df).set_index("Date")
+
+# Per-period totals (e.g. daily flows) plus the totals of the new rows
+def add_period_totals(df_totals : pd.DataFrame, df_delta : pd.DataFrame):
+    return df_totals.add(df_delta, fill_value=0).astype(df_totals.dtypes.to_dict())
+
+# Monthly cashflow table plus per-month flow totals of new rows: flows of the
+# affected months change, liquidity of every month from the first one on
+def apply_cashflow_deltas(df_m_cashflow : pd.DataFrame, m_delta : pd.DataFrame):
+    m_delta = m_delta.reindex(index=df_m_cashflow.index, columns=FLOWS, fill_value=0).astype('float64')
+    affected = (m_delta != 0).any(axis=1).values
+    df_m_cashflow = df_m_cashflow.copy()
+    if not affected.any():
+        return df_m_cashflow
+
+    prev_investments = df_m_cashflow["investments"].abs()
+    df_m_cashflow["incomes"] += m_delta["incomes"]
+    df_m_cashflow["liabilities"] += m_delta["liabilities"]
+    df_m_cashflow["investments"] += m_delta["investments"]
+    d_savings = m_delta["incomes"] + m_delta["liabilities"]
+    df_m_cashflow["savings"] += d_savings
+    saving_rate = (df_m_cashflow["savings"] / df_m_cashflow["incomes"]).where(df_m_cashflow["incomes"] != 0, 0.0)
+    df_m_cashflow.loc[affected, "saving_rate"] = saving_rate.loc[affected]
+    df_m_cashflow["liquidity"] += (d_savings - (df_m_cashflow["investments"].abs() - prev_investments)).cumsum()
+    return df_m_cashflow
+
+# Balance timeline plus the daily account sums of new rows, added to every
+# later day; new days start from the balance of the day before
+def apply_balance_deltas(df_timeline : pd.DataFrame, df_daily_delta : pd.DataFrame):
+    accounts = df_timeline.columns.append(df_daily_delta.columns.difference(df_timeline.columns))
+    index = df_timeline.index.union(df_daily_delta.index)
+    df_timeline = df_timeline.reindex(columns=accounts, fill_value=0.0).reindex(index).ffill()
+    df_delta = df_daily_delta.reindex(index=index, columns=accounts, fill_value=0).astype('float64').cumsum()
+    return df_timeline + df_delta
+
+# Monthly holdings of build_holdings_monthlyized plus new investment rows: Qty
+# of the affected months, CumQty from there on. Returns the updated holdings
+# and the touched (asset class, symbol) pairs, new symbols at the end.
+def apply_holdings_deltas(df_holdings : pd.DataFrame, df_new : pd.DataFrame, complete_index : pd.DatetimeIndex):
+    df_delta = build_holdings_monthlyized(df_new, complete_index)
+    columns = df_holdings.columns.append(df_delta.columns[~df_delta.columns.isin(df_holdings.columns)])
+    df_holdings = df_holdings.reindex(columns=columns, fill_value=0.0) + df_delta.reindex(columns=columns, fill_value=0.0)
+    touched = list(df_delta.columns.droplevel(2)[::2])
+    return df_holdings, touched
@@ -0,0 +1,197 @@
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+from .logger import Logger
+
+from .errors import *
+
+class FinAnomaly:
+    """
+    Rolling statistics of the spending per Category (or per account with
+    by="Type") and flags of the months and transactions deviating from them.
+
+    The window of the last `window` months is a ring buffer holding, for every
+    month and key, the spent total, the number of transactions and the sum of
+    their squared deviations from the month mean. Folding a new month in
+    overwrites the oldest slot and the statistics are reductions of the
+    buffer: O(window x keys), whatever the history length. Deviations are
+    always centred, so constant amounts have a std of exactly zero.
+    Every month is scored against the window before it, so a spike does not
+    hide itself. Against a constant history (std within STD_EPS of the mean
+    plus STD_FLOOR) any deviation beyond that tolerance scores +-inf, so it
+    is flagged, and no deviation scores 0. Keys without transactions in the
+    window are not scored.
+
+        anomaly = FinAnomaly(window=12)
+        df_months, df_transactions = anomaly.fit(load_ledger("cashflow", path))
+        df_months, df_transactions = anomaly.update(df_new_month) # next month only
+
+    Attributes:
+        by (str): Column the spending is grouped by.
+        window (int): Months in the rolling window.
+        keys (pd.Index): Keys seen so far, columns of the buffers.
+        ring_total, ring_count, ring_m2 (np.ndarray): window x keys monthly buffers.
+        last_month (pd.Timestamp): Last month folded in, as month end.
+    """
+    QUANTILES = [0.1, 0.5, 0.9]
+    STD_EPS = 1e-9 # relative to the mean, float noise below it
+    STD_FLOOR = 1e-6 # absolute, in the ledger currency
+
+    def __init__(self, by: str = "Category", window: int = 12, z_threshold: float = 3.0, min_months: int = 3):
+        Logger.info("Initializing FinAnomaly class.")
+        self.by : str = by
+        self.window : int = window
+        self.z_threshold : float = z_threshold
+        self.min_months : int = min_months
+        self.keys : pd.Index = pd.Index([], dtype=object)
+        self.ring_total = np.zeros((window, 0))
+        self.ring_count = np.zeros((window, 0))
+        self.ring_m2 = np.zeros((window, 0))
+        self.pos : int = 0 # ring slot of the next month
+        self.filled : int = 0 # months in the window
+        self.last_month : pd.Timestamp = None
+
+    # Spending rows: what calc_expenses reports, as positive amounts
+    def expenses(self, df: pd.DataFrame):
+        df_expenses = df.loc[(df["Category"] != "Transfer") & (df["Qty"] < 0)]
+        return df_expenses.assign(Expenses=-df_expenses["Qty"].values)
+
+    def add_keys(self, keys):
+        new_keys = pd.Index(pd.unique(np.asarray(keys, dtype=object))).difference(self.keys)
+        if len(new_keys):
+            self.keys = self.keys.append(new_keys)
+            pad = ((0, 0), (0, len(new_keys)))
+            self.ring_total = np.pad(self.ring_total, pad)
+            self.ring_count = np.pad(self.ring_count, pad)
+            self.ring_m2 = np.pad(self.ring_m2, pad)
+
+    # Window statistics per key, reductions of the buffers. The transaction
+    # variance combines the centred sums of the months (Chan et al.), the
+    # slots not filled yet or without transactions add nothing.
+    def window_stats(self):
+        months = max(self.filled, 1)
+        total = self.ring_total.sum(axis=0)
+        count = self.ring_count.sum(axis=0)
+        mean = total / months
+        std = self.ring_total[:self.filled].std(axis=0) if self.filled else np.zeros(len(self.keys))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tx_mean = np.where(count > 0, total / count, np.nan)
+            month_tx_mean = np.where(self.ring_count > 0, self.ring_total / self.ring_count, tx_mean)
+            m2 = self.ring_m2.sum(axis=0) + (self.ring_count * (month_tx_mean - tx_mean) ** 2).sum(axis=0)
+            tx_std = np.sqrt(np.where(count > 0, m2 / count, np.nan))
+        return mean, std, tx_mean, tx_std
+
+    def stats(self):
+        mean, std, tx_mean, tx_std = self.window_stats()
+        df_stats = pd.DataFrame({"Mean": mean, "Std": std, "TxMean": tx_mean, "TxStd": tx_std}, index=self.keys)
+        months = self.ring_total if self.filled == self.window else self.ring_total[:self.filled]
+        if self.filled:
+            quantiles = np.quantile(months, self.QUANTILES, axis=0)
+            for q, values in zip(self.QUANTILES, quantiles):
+                df_stats[f"Q{int(q*100)}"] = values
+        df_stats.index.name = self.by
+        return df_stats
+
+    def fold(self, total: np.ndarray, count: np.ndarray, m2: np.ndarray):
+        self.ring_total[self.pos] = total
+        self.ring_count[self.pos] = count
+        self.ring_m2[self.pos] = m2
+        self.pos = (self.pos + 1) % self.window
+        self.filled = min(self.filled + 1, self.window)
+
+    # (values - mean) / std, see the class docstring for a constant history
+    def z_scores(self, values, mean, std):
+        deviation = values - mean
+        tolerance = self.STD_FLOOR + self.STD_EPS * np.abs(mean)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_constant = np.where(np.abs(deviation) <= tolerance, 0.0, np.sign(deviation) * np.inf)
+            return np.where(std <= tolerance, z_constant, deviation / std)
+
+    # Scores the transactions of one month against the window, then folds the
+    # month in. Months must come in order; skipped months count as no spending.
+    # month is needed for a month without transactions before any other,
+    # otherwise it is the month after the last folded one.
+    def update(self, df_month: pd.DataFrame, month = None):
+        if len(df_month) == 0: # a month without transactions
+            if month is not None:
+                month = pd.Timestamp(month) + pd.offsets.MonthEnd(0)
+            elif self.last_month is not None:
+                month = self.last_month + pd.offsets.MonthEnd(1)
+            else:
+                raise ValueError("No month folded yet, give the month of an update without transactions")
+        else:
+            month = df_month.index.min() + pd.offsets.MonthEnd(0)
+            if df_month.index.max() > month:
+                raise ValueError("update takes the transactions of a single month")
+        if self.last_month is not None and month <= self.last_month:
+            raise ValueError(f"Month {month.date()} is not after the last folded month {self.last_month.date()}")
+        if self.last_month is not None:
+            for _ in range(len(pd.date_range(self.last_month, month, freq='ME')) - 2): # months without transactions
+                zeros = np.zeros(len(self.keys))
+                self.fold(zeros, zeros, zeros)
+
+        df_expenses = self.expenses(df_month)
+        keys = df_expenses[self.by].astype(object).values
+        self.add_keys(keys)
+        codes = self.keys.get_indexer(keys)
+        amounts = df_expenses["Expenses"].values
+        total = np.bincount(codes, weights=amounts, minlength=len(self.keys))
+        count = np.bincount(codes, minlength=len(self.keys)).astype('float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            month_tx_mean = np.where(count > 0, total / count, 0.0)
+        m2 = np.bincount(codes, weights=(amounts - month_tx_mean[codes]) ** 2, minlength=len(self.keys))
+
+        mean, std, tx_mean, tx_std = self.window_stats()
+        scored = self.filled >= self.min_months
+        known = self.ring_count.sum(axis=0) > 0 # keys with transactions in the window
+        month_z = np.where(known, self.z_scores(total, mean, std), np.nan) if scored else np.full(len(self.keys), np.nan)
+        df_months = pd.DataFrame({
+            "Month": month, self.by: self.keys, "Total": total, "Mean": mean, "Std": std, "Z": month_z,
+        })
+        df_months["Flag"] = np.abs(df_months["Z"]) > self.z_threshold
+        df_months = df_months.loc[(df_months["Total"] > 0) | (df_months["Mean"] > 0)]
+
+        tx_z = self.z_scores(amounts, tx_mean[codes], tx_std[codes]) if scored else np.full(len(amounts), np.nan)
+        df_transactions = df_expenses.assign(Z=tx_z).loc[np.abs(tx_z) > self.z_threshold]
+
+        self.fold(total, count, m2)
+        self.last_month = month
+        return df_months.reset_index(drop=True), df_transactions
+
+    # Folds a whole date-indexed ledger month by month, returns all the month
+    # scores and the flagged transactions
+    def fit(self, df: pd.DataFrame):
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind='stable')
+        dfl_months, dfl_transactions = list(), list()
+        for month, df_month in df.groupby(df.index.to_period('M'), sort=True):
+            df_months, df_transactions = self.update(df_month)
+            dfl_months.append(df_months)
+            dfl_transactions.append(df_transactions)
+        Logger.info(f"Folded {len(dfl_months)} months of {self.by} spending")
+        if not dfl_months: # empty ledger
+            df_months = pd.DataFrame(columns=["Month", self.by, "Total", "Mean", "Std", "Z", "Flag"])
+            return df_months, self.expenses(df).assign(Z=np.nan)
+        return pd.concat(dfl_months, ignore_index=True), pd.concat(dfl_transactions)
+
+    # The state, to resume the next update in a later run. last_month is ""
+    # when nothing was folded yet.
+    def save(self, filepath):
+        last_month = "" if self.last_month is None else str(self.last_month.date())
+        np.savez(filepath, keys=np.array(self.keys, dtype=str), ring_total=self.ring_total, ring_count=self.ring_count,
+                 ring_m2=self.ring_m2, pos=self.pos, filled=self.filled, last_month=last_month)
+
+    def load(self, filepath):
+        path_o = Path(filepath)
+        if not path_o.exists():
+            Logger.error("Wrong path!")
+            raise PathError(f"Entered path {path_o} does not exist! Cannot load anomaly state.")
+        with np.load(path_o, allow_pickle=False) as state:
+            if state["ring_total"].shape[0] != self.window:
+                raise ValueError(f"Saved window of {state['ring_total'].shape[0]} months, expected {self.window}")
+            self.keys = pd.Index(state["keys"].astype(object))
+            self.ring_total, self.ring_count, self.ring_m2 = state["ring_total"], state["ring_count"], state["ring_m2"]
+            self.pos, self.filled = int(state["pos"]), int(state["filled"])
+            last_month = str(state["last_month"])
+            self.last_month = pd.Timestamp(last_month) if last_month else None
@@ -0,0 +1,42 @@
+from pathlib import Path
+import pandas as pd
+
+from .logger import Logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+# Frames are written as uncompressed Arrow IPC (Feather v2) files, so that
+# readers can memory-map them: no parsing and no copy of the numeric buffers,
+# and several processes can share the same pages.
+
+def check_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required to export or import Arrow IPC files")
+
+def export_arrow(df : pd.DataFrame, filepath):
+    check_pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    feather.write_feather(table, str(filepath), compression="uncompressed")
+    Logger.info(f"Arrow IPC file saved to {filepath}")
+
+# Zero-copy view of the file, the table stays backed by the memory map
+def read_arrow_table(filepath):
+    check_pyarrow()
+    source = pa.memory_map(str(filepath), "r")
+    return pa.ipc.open_file(source).read_all()
+
+def import_arrow(filepath):
+    return read_arrow_table(filepath).to_pandas(split_blocks=True)
+
+def export_frames(dirpath, prefix : str, frames : dict):
+    dirpath = Path(dirpath)
+    dirpath.mkdir(parents=True, exist_ok=True)
+    filepaths = dict()
+    for name, df in frames.items():
+        filepaths[name] = dirpath / f"{prefix}_{name}.arrow"
+        export_arrow(df, filepaths[name])
+    return filepaths
@@ -0,0 +1,120 @@
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import json
+import calendar
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+
+class FinBudget:
+    """
+    Monthly expense budgets per Category or Category/Subcategory, compared
+    with the actual expenses of every month at once.
+
+    Budgets are read from a JSON file holding one or more scenarios:
+        {
+            "base":  {"Groceries": 400, "Leisure": {"Cinema": 30, "Bar": 50}},
+            "tight": {"Groceries": 300, "Leisure": {"Cinema": 20, "Bar": 30}}
+        }
+    A label is either a Category ("Groceries") or a "Category/Subcategory"
+    pair ("Leisure/Cinema"). Actual expenses come from the expense rollup cube
+    (build_expense_cube), so months x labels x scenarios are evaluated as a
+    single broadcast array operation whatever the size of the ledger.
+
+    Attributes:
+        budgets (pd.DataFrame): Monthly budget of every scenario (rows) and label (columns).
+    """
+    def __init__(self, budgets_path: str = None, budgets: dict = None):
+        Logger.info("Initializing FinBudget class.")
+        if budgets is None:
+            path_o = Path(budgets_path)
+            if not path_o.exists():
+                Logger.error("Wrong path!")
+                raise PathError(f"Entered path {path_o} does not exist! Cannot load budgets.")
+            with open(path_o) as file:
+                budgets = json.loads(file.read())
+
+        self.budgets : pd.DataFrame = self.budget_matrix(budgets)
+
+    # Scenarios x labels, labels missing from a scenario have a zero budget
+    def budget_matrix(self, budgets: dict):
+        rows = dict()
+        for scenario, categories in budgets.items():
+            row = dict()
+            for category, amount in categories.items():
+                if isinstance(amount, dict):
+                    for subcategory, sub_amount in amount.items():
+                        row[f"{category}/{subcategory}"] = float(sub_amount)
+                else:
+                    row[category] = float(amount)
+            rows[scenario] = row
+        df_budgets = pd.DataFrame.from_dict(rows, orient="index").fillna(0.0)
+        df_budgets.index.name = "Scenario"
+        df_budgets.columns.name = "Label"
+        return df_budgets
+
+    # Months x labels actual expenses, every month from January of the first
+    # year of the cube to December of the last one, or to the current month.
+    # A cube without expenses gives zeros over YEAR (the year of today by default).
+    def actual_matrix(self, df_cube: pd.DataFrame, today: datetime, YEAR: int = None):
+        if df_cube.empty:
+            first_year = last_year = today.year if YEAR is None else YEAR
+        else:
+            years = df_cube.index.get_level_values("Year")
+            first_year, last_year = int(years.min()), int(years.max())
+        end = f"{last_year}-12-31" if last_year < today.year else today.strftime("%Y-%m-%d")
+        months = pd.date_range(start=f"{first_year}-01-01", end=pd.Timestamp(end) + pd.offsets.MonthEnd(0), freq='ME')
+        if df_cube.empty:
+            return pd.DataFrame(0.0, index=months, columns=self.budgets.columns)
+
+        df_labels = df_cube.reset_index()
+        df_labels["Category"] = df_labels["Category"].astype(str)
+        df_labels["Subcategory"] = df_labels["Category"] + "/" + df_labels["Subcategory"].astype(str)
+        df_labels["Date"] = pd.to_datetime(dict(year=df_labels["Year"], month=df_labels["Month"], day=1)) + pd.offsets.MonthEnd(0)
+
+        df_actual = pd.concat([
+            df_labels.groupby(["Date", level])["Qty"].sum().unstack(level) for level in ("Category", "Subcategory")
+        ], axis=1)
+        return df_actual.reindex(index=months, columns=self.budgets.columns).fillna(0.0)
+
+    # Per scenario and label, for every month:
+    #   variance         budget - actual, negative when over budget
+    #   ytd_burn         year to date actual / year to date budget
+    #   forecast         actual, the current partial month projected at its run-rate
+    #   forecast_variance budget - forecast
+    # Results are months x (Scenario, Label) frames.
+    def evaluate(self, df_cube: pd.DataFrame, today: datetime = None, YEAR: int = None):
+        if today is None:
+            today_date_str, today_month_str, today = define_today_date()
+        df_actual = self.actual_matrix(df_cube, today, YEAR)
+        months = df_actual.index
+
+        actual = df_actual.values[None, :, :]                # 1 x months x labels
+        budget = self.budgets.values[:, None, :]             # scenarios x 1 x labels
+        ytd_actual = df_actual.groupby(months.year).cumsum().values[None, :, :]
+        ytd_budget = budget * months.month.values[None, :, None]
+
+        # run-rate of the current month: spent so far over the elapsed share of it
+        run_rate = np.ones(len(months))
+        curr_month = (months.year == today.year) & (months.month == today.month)
+        run_rate[curr_month] = calendar.monthrange(today.year, today.month)[1] / today.day
+        forecast = actual * run_rate[None, :, None]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ytd_burn = np.where(ytd_budget > 0, ytd_actual / ytd_budget, np.nan)
+
+        columns = pd.MultiIndex.from_product([self.budgets.index, self.budgets.columns], names=["Scenario", "Label"])
+        def to_frame(values):
+            values = np.broadcast_to(values, (len(self.budgets), len(months), len(self.budgets.columns)))
+            return pd.DataFrame(values.transpose(1, 0, 2).reshape(len(months), -1), index=months, columns=columns)
+
+        return {
+            "actual": df_actual,
+            "variance": to_frame(budget - actual),
+            "ytd_burn": to_frame(ytd_burn),
+            "forecast": to_frame(forecast),
+            "forecast_variance": to_frame(budget - forecast),
+        }
@@ -0,0 +1,70 @@
+from pathlib import Path
+import pandas as pd
+import json
+import os
+
+from .logger import Logger
+
+try:
+    import pyarrow.feather as feather
+except ImportError: # pickle fallback, still a single read
+    feather = None
+
+def file_fingerprint(filepath) -> list:
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns]
+
+class LedgerCache:
+    """
+    On-disk cache of the parsed month files of one year of ledger data.
+
+    Every month CSV is fingerprinted by size and modification time: months whose
+    fingerprint matches the manifest are served from the cached frame, the
+    others are parsed again and the cache is rewritten.
+
+    Attributes:
+        cache_dir (Path): Directory holding the cached frame and its manifest.
+        data_path (Path): Cached frame of all months, with a `_month` column.
+        manifest_path (Path): JSON mapping month -> [filename, size, mtime].
+    """
+    VERSION = 2 # bump when the layout of the parsed frames changes
+
+    def __init__(self, typedata: str, path: Path, YEAR: int):
+        ext = "feather" if feather is not None else "pkl"
+        self.cache_dir = Path(f"{path}/{YEAR}/{typedata}/.cache")
+        self.data_path = self.cache_dir / f"{YEAR}_{typedata}_v{self.VERSION}.{ext}"
+        self.manifest_path = self.cache_dir / f"{YEAR}_{typedata}_v{self.VERSION}.json"
+
+    def load(self):
+        if not (self.manifest_path.exists() and self.data_path.exists()):
+            return dict(), None
+        try:
+            with open(self.manifest_path) as file:
+                manifest = json.loads(file.read())
+            if feather is not None:
+                df_cached = feather.read_feather(self.data_path)
+            else:
+                df_cached = pd.read_pickle(self.data_path)
+        except Exception as e:
+            Logger.warning(f"Discarding unreadable ledger cache {self.data_path}: {e}")
+            return dict(), None
+        return manifest, df_cached
+
+    def save(self, manifest: dict, df_cached: pd.DataFrame):
+        try:
+            self.cache_dir.mkdir(exist_ok=True)
+            df_cached = df_cached.reset_index(drop=True)
+            if feather is not None:
+                feather.write_feather(df_cached, self.data_path)
+            else:
+                df_cached.to_pickle(self.data_path)
+            # manifest last, so a partial write never validates a stale frame
+            with open(self.manifest_path, "w") as file:
+                file.write(json.dumps(manifest))
+        except Exception as e:
+            Logger.warning(f"Could not write ledger cache {self.data_path}: {e}")
+
+    # Rows of cached month i are df_cached[bounds[i-1]:bounds[i]], frame is stored in month order
+    def split_months(self, df_cached: pd.DataFrame):
+        bounds = df_cached["_month"].searchsorted(range(1, 14))
+        return {i: df_cached.iloc[bounds[i-1]:bounds[i]] for i in range(1, 13)}
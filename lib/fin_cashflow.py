@@ -6,6 +6,10 @@ from .logger import Logger
 
 from .commonlib import *
 from .errors import *
+from .fin_arrow import export_frames
+from .fin_import import FinImport
+from .fin_query import LedgerIndex
+from .fin_fx import FinFX
 
 class FinCashflow:
     """
@@ -14,9 +18,19 @@ class FinCashflow:
     Attributes:
         init_holdings (dict): A dictionary to store initial holdings.
         df_year_cashflow (pd.DataFrame): DataFrame to track yearly cash flow.
+        ledger_version (int): Number of appends applied to the ledger since it was loaded.
+        ledger_index (LedgerIndex): Positional indexes of the ledger for slicing queries.
+        df_expense_cube (pd.DataFrame): Expenses and counts per (Year, Month, Category, Subcategory).
+        account_sums (pd.Series): Sum of the transactions of every account (Type).
+        df_daily_flows (pd.DataFrame): Per-day incomes, liabilities and investments totals.
+        df_balance_timeline (pd.DataFrame): Per-day running balance of every account.
         df_m_cashflow (pd.DataFrame) : Table which resumes monthly data
+        exact_cents (bool): Aggregate the int64 Cents column instead of the float Qty.
+        as_of (datetime): Date the tables are evaluated at, the wall clock at init by default.
+        fx (FinFX): Conversion of every Coin into the reporting currency, None without one.
+        memo (dict): Tables already computed, keyed by (table, ledger version, as_of, ...).
     """
-    def __init__(self, path: str, YEAR: int):
+    def __init__(self, path: str, YEAR: int, use_cache: bool = False, workers: int = 1, db = None, ledger: pd.DataFrame = None, exact_cents: bool = False, as_of = None, currency: str = None, init_holdings: dict = None):
         Logger.info("Initializing FinCashflow class.")
         path_o = Path(path)
         if path_o.exists():
@@ -26,29 +40,78 @@ class FinCashflow:
             raise PathError(f"Entered path {path_o} does not exist! Cannot load files.")
 
         self.YEAR : int = YEAR
-        self.init_holdings : Dict[str, float] = load_init_holdings(self.path, self.YEAR)
-        self.df_year_cashflow : pd.DataFrame = load_data("cashflow", self.path, self.YEAR)
+        if init_holdings is None:
+            init_holdings = load_init_holdings(self.path, self.YEAR)
+        self.init_holdings : Dict[str, float] = init_holdings # from the init json unless given, e.g. chained by FinChain
+        self.db = db # optional LedgerDB, aggregates are then pushed down to SQLite
+        if ledger is not None: # slice of a multi-year ledger, see load_cashflow_years
+            self.df_year_cashflow : pd.DataFrame = ledger_year(ledger, self.YEAR)
+        elif self.db is not None:
+            self.df_year_cashflow : pd.DataFrame = self.db.load_year("cashflow", self.YEAR)
+        else:
+            self.df_year_cashflow : pd.DataFrame = load_data("cashflow", self.path, self.YEAR, use_cache, workers)
+        self.as_of : datetime = resolve_as_of(as_of) # read once, so that all the tables agree on "today"
+        self.fx : FinFX = None
+        if currency is not None: # all the tables in currency, whatever the Coin of the rows
+            self.fx = FinFX(self.path, self.YEAR, currency, self.as_of)
+            self.df_year_cashflow = self.fx.convert(self.df_year_cashflow)
+            self.init_holdings = self.fx.convert_holdings(self.init_holdings)
+        self.exact_cents : bool = exact_cents
+        if self.exact_cents: # money summed as integers, converted back to floats only in the tables
+            self.df_year_cashflow = add_cents(self.df_year_cashflow)
+        self.amount : str = "Cents" if self.exact_cents else "Qty"
+        self.memo : dict = dict()
+        self.ledger_version : int = 0 # bumped by every append_transactions
+        self.ledger_index : LedgerIndex = None # see get_ledger_index
+        self.df_expense_cube : pd.DataFrame = None # see get_expense_cube
+        self.expense_cube_version : int = -1
+        self.account_sums : pd.Series = None # see calc_account_sums
+        self.df_daily_flows : pd.DataFrame = None # see calc_daily_flows
+        self.df_balance_timeline : pd.DataFrame = None # see calc_balance_timeline
         self.df_m_cashflow : pd.DataFrame = pd.DataFrame()
         self.df_last_month_cashflow : pd.DataFrame = pd.DataFrame()
         pass
 
-    def get_all_balances(self):
-        balances = dict()
-        accounts = self.df_year_cashflow['Type'].unique().tolist()
-        for cc in accounts:
-            if cc in self.init_holdings['liquidity_eur'].keys():
-                val = self.df_year_cashflow.loc[self.df_year_cashflow["Type"] == cc]['Qty'].sum() + self.init_holdings['liquidity_eur'][cc]
-                balances[cc] = round(float(val), 2)
+    # SQLite aggregates only when the amounts need no conversion
+    def use_db(self):
+        return self.db is not None and self.fx is None
+
+    # Per-account sums, computed once and then kept up to date by append_transactions
+    def calc_account_sums(self):
+        if self.account_sums is None:
+            if self.use_db():
+                self.account_sums = self.db.account_sums(f"{self.YEAR}-01-01", f"{self.YEAR}-12-31", cents=self.exact_cents)
             else:
-                val = self.df_year_cashflow.loc[self.df_year_cashflow["Type"] == cc]['Qty'].sum()
-                balances[cc] = round(float(val), 2)
+                self.account_sums = self.df_year_cashflow.groupby("Type", observed=True)[self.amount].sum()
+        return self.account_sums
 
-        return balances
+    def get_all_balances(self):
+        return build_balances(self.calc_account_sums(), self.init_holdings, self.exact_cents)
     
+    # Daily running balances of all accounts, built once per ledger
+    def calc_balance_timeline(self):
+        if self.df_balance_timeline is None:
+            self.df_balance_timeline = build_balance_timeline(self.df_year_cashflow, self.init_holdings, self.YEAR, self.exact_cents)
+        return self.df_balance_timeline
+
+    # e.g. balance_as_of("2025-03-31") or balance_as_of("2025-03-31", "Revolut")
+    def balance_as_of(self, date, account : str = None):
+        return balance_as_of(self.calc_balance_timeline(), date, account)
+
+    # Built on first use, again after the ledger changes
+    def get_ledger_index(self):
+        if self.ledger_index is None:
+            self.ledger_index = LedgerIndex(self.df_year_cashflow)
+        return self.ledger_index
+
+    # Ledger rows by date range or period and labels, see LedgerIndex.select
+    def query(self, start = None, end = None, period = None, **filters):
+        return self.get_ledger_index().select(start, end, period, **filters)
+
     def calc_expenses(self, month : int = None): # For donut plot expenses
-        # If month is provided, filter by month; otherwise, use the entire DataFrame
+        # If month is provided, slice that month; otherwise, use the entire DataFrame
         if month is not None:
-            df_selected = self.df_year_cashflow[self.df_year_cashflow.index.month == month]
+            df_selected = self.query(period=f"{self.YEAR}-{month:0=2}")
         else:
             df_selected = self.df_year_cashflow  # Use the entire DataFrame for yearly calculation
 
@@ -61,91 +124,150 @@ class FinCashflow:
         df_expenses["Qty"] = df_expenses.Qty.abs() # plotly sunburst does not understand negative values
 
         return df_expenses
+
+    # Built once per ledger version, the breakdowns below then cost O(categories)
+    def get_expense_cube(self):
+        if self.df_expense_cube is None or self.expense_cube_version != self.ledger_version:
+            self.df_expense_cube = build_expense_cube(self.df_year_cashflow, self.exact_cents)
+            self.expense_cube_version = self.ledger_version
+        return self.df_expense_cube
+
+    # Expenses per Category/Subcategory of a month or of the year, for donuts and tables
+    def calc_expense_breakdown(self, month : int = None):
+        return expense_breakdown(self.get_expense_cube(), self.YEAR, month)
+
+    # Budget variance, burn and run-rate forecast of every month, see FinBudget.evaluate.
+    # Expenses dated after as_of are left out, the run-rate projects the month as of that day.
+    def calc_budget(self, budget, as_of = None):
+        as_of = self.resolve(as_of)
+        df_cube = self.get_expense_cube()
+        if self.df_year_cashflow.index.max() > as_of:
+            key = ("expense_cube", self.ledger_version, as_of)
+            if key not in self.memo:
+                self.memo[key] = build_expense_cube(self.query(end=as_of), self.exact_cents)
+            df_cube = self.memo[key]
+        return budget.evaluate(df_cube, as_of, self.YEAR)
+
+    # Monthly expenses per Category (or Subcategory), for trend charts
+    def calc_expenses_trend(self, level : str = "Category"):
+        return expense_trend(self.get_expense_cube(), self.YEAR, level)
     
-    def calc_monthly_cashflow(self):
-        end_date = define_end_date(self.YEAR)
-        df_year_cashflow = self.df_year_cashflow.loc[self.df_year_cashflow.index <= end_date]
+    # Per-day totals of the flows, the only pass over the ledger every
+    # frequency and the current month are then aggregated from
+    def calc_daily_flows(self):
+        if self.df_daily_flows is None:
+            if self.use_db():
+                self.df_daily_flows = self.db.daily_cashflow_totals(f"{self.YEAR}-01-01", f"{self.YEAR}-12-31", cents=self.exact_cents)
+            else:
+                self.df_daily_flows = flow_totals(self.df_year_cashflow, self.amount, 'D')
+        return self.df_daily_flows
 
-        incomes = df_year_cashflow.loc[(df_year_cashflow["Category"] != "Transfer") & (df_year_cashflow["Qty"] > 0)]
-        liabilities = df_year_cashflow.loc[(df_year_cashflow["Category"] != "Transfer") & (df_year_cashflow["Qty"] <= 0)]
-        investments = df_year_cashflow.loc[ (df_year_cashflow["Category"] == "Transfer") & (df_year_cashflow["Subcategory"] == "Invest")]
-        
-        m_incomes = incomes.resample(rule='ME')['Qty'].sum()
-        m_liab = liabilities.resample(rule='ME')['Qty'].sum()
-        m_savings = incomes.resample(rule='ME')['Qty'].sum() + liabilities.resample(rule='ME')['Qty'].sum()
-        m_investments = investments.resample(rule='ME')['Qty'].sum()
-        m_savingrate = m_savings / m_incomes
-
-        Logger.debug("\n m_incomes:\n%s", m_incomes.to_string())
-        Logger.debug("\n m_liab:\n%s", m_liab.to_string())
-        Logger.debug("\n m_savings:\n%s", m_savings.to_string())
-        Logger.debug("\n m_investments:\n%s", m_investments.to_string())
-        Logger.debug("\n m_savingrate:\n%s", m_savingrate.to_string())
-
-
-        # Add fill values to m_investments otherwise shifted data
-        complete_index = pd.date_range(start=f"{self.YEAR}-01-01", end=end_date, freq='ME') # End of month
-        df_month_fill = pd.DataFrame(index=complete_index, data=0.0, columns=["Qty"], dtype='float64')
-        temp_fill = df_month_fill.Qty.copy()
-        temp_fill.update(m_investments)
-
-        zipped = zip(
-            m_incomes.index, m_incomes.values,
-            m_liab.values, m_savings.values,
-            m_savingrate.values, temp_fill.values, # m_investments
-        )
-
-        df_m_cashflow = pd.DataFrame(zipped,columns=["Date","incomes","liabilities","savings","saving_rate","investments"]).set_index("Date")
-        
-        # if in a month no transactions happen, then add column of that month filled with zero
-        df_m_cashflow = df_m_cashflow.reindex(temp_fill.index, fill_value=0)
-
-        # Calculate cumulative savings + init 
-        init_liquidity = 0
-        for cc, val in self.init_holdings['liquidity_eur'].items():
-            init_liquidity += val
-
-        init_row = pd.DataFrame({
-            "incomes": ['-'],
-            "liabilities": ['-'],
-            "savings": [init_liquidity],
-            "saving_rate": ['-'],
-            "investments": [0]
-        }, index=[datetime(self.YEAR-1, 12, 31)])
-
-        df_monthly_cashflow = pd.concat([init_row, df_m_cashflow])
-        df_monthly_cashflow['liquidity'] = df_monthly_cashflow['savings'].values.cumsum() - df_monthly_cashflow['investments'].abs().values.cumsum()
-        return df_monthly_cashflow
-
-    def calc_curr_month_cashflow(self):
-        today_date_str, today_month_str, today = define_today_date()
-        prev_month_liquidity, prev_month_investments = define_prev_month_holdings(self.df_m_cashflow)
-        df_curr_month_cashflow = self.df_year_cashflow.loc[today_month_str]
-
-        incomes = df_curr_month_cashflow.loc[(df_curr_month_cashflow["Category"] != "Transfer") & (df_curr_month_cashflow["Qty"] > 0)]
-        liabilities = df_curr_month_cashflow.loc[(df_curr_month_cashflow["Category"] != "Transfer") & (df_curr_month_cashflow["Qty"] <= 0)]
-        investments = df_curr_month_cashflow.loc[ (df_curr_month_cashflow["Category"] == "Transfer") & (df_curr_month_cashflow["Subcategory"] == "Invest")]
-
-        m_incomes     = float(incomes    ['Qty'].sum()  )
-        m_liab        = float(liabilities['Qty'].sum()  )
-        m_savings     = float(incomes    ['Qty'].sum() + liabilities['Qty'].sum()  )
-        m_investments = float(investments['Qty'].sum()  )
-        try:
-            m_savingrate  = float(m_savings / m_incomes     )
-        except Exception as ZeroDivisionError:
-            m_savingrate = 0;
-
-        row_today_cashflow = pd.DataFrame({
-            "incomes": [m_incomes],
-            "liabilities": [m_liab],
-            "savings": [m_savings],
-            "saving_rate": [m_savingrate],
-            "investments": [prev_month_investments + m_investments],
-            "liquidity": [prev_month_liquidity + m_savings - abs(m_investments)]
-        }, index=[datetime(today.year, today.month, today.day)])
-
-        return row_today_cashflow
-
-    def run(self):
+    # The date to evaluate at: as_of if given, otherwise the one of the instance
+    def resolve(self, as_of = None):
+        return self.as_of if as_of is None else resolve_as_of(as_of)
+
+    # Cashflow table at any frequency: 'W', 'ME', 'QE', 'YE'..., of the periods
+    # complete by the end date (the previous month end in the current year)
+    # e.g. calc_cashflow('ME', as_of="2025-06-15") is the table as it was on that day
+    def calc_cashflow(self, freq : str = 'ME', as_of = None):
+        as_of = self.resolve(as_of)
+        key = ("cashflow", self.ledger_version, as_of, freq)
+        if key not in self.memo:
+            end_date = define_end_date(self.YEAR, as_of)
+            df_daily_flows = self.calc_daily_flows()
+            df_totals = df_daily_flows.loc[df_daily_flows.index <= end_date].resample(freq).sum()
+
+            Logger.debug("\n %s totals:\n%s", freq, df_totals.to_string())
+
+            self.memo[key] = build_monthly_cashflow(df_totals["incomes"], df_totals["liabilities"], df_totals["investments"], self.init_holdings, self.YEAR, end_date, self.exact_cents, freq)
+        return self.memo[key]
+
+    def calc_monthly_cashflow(self, as_of = None):
+        return self.calc_cashflow('ME', as_of)
+
+    # The month of as_of up to as_of, on top of the monthly table
+    def calc_curr_month_cashflow(self, as_of = None):
+        as_of = self.resolve(as_of)
+        key = ("curr_month_cashflow", self.ledger_version, as_of)
+        if key not in self.memo:
+            today_date_str, today_month_str, today = define_today_date(as_of)
+            df_daily_flows = self.calc_daily_flows()
+            # a mask, since a partial string lookup raises on a sorted index without current month rows;
+            # rows dated after as_of are not known yet on that day
+            curr_month = (df_daily_flows.index.year == today.year) & (df_daily_flows.index.month == today.month) & (df_daily_flows.index <= today)
+            totals = df_daily_flows.loc[curr_month].sum()
+
+            as_number = int if self.exact_cents else float
+            m_incomes     = as_number(totals["incomes"]    )
+            m_liab        = as_number(totals["liabilities"])
+            m_investments = as_number(totals["investments"])
+            self.memo[key] = build_curr_month_cashflow(m_incomes, m_liab, m_investments, self.calc_monthly_cashflow(as_of), today, self.exact_cents)
+        return self.memo[key]
+
+    # run(as_of="2025-06-15") sets the date of the instance and rebuilds the
+    # tables of that day, from the memo when already computed
+    def run(self, as_of = None):
+        if as_of is not None:
+            self.as_of = resolve_as_of(as_of)
         self.df_m_cashflow = self.calc_monthly_cashflow()
-        self.df_last_month_cashflow = self.calc_curr_month_cashflow()
\ No newline at end of file
+        self.df_last_month_cashflow = self.calc_curr_month_cashflow()
+
+    # Adds transactions (list of dicts or frame with the month file columns)
+    # and shifts what was already computed by the effect of the new rows only.
+    # With persist=True they are also appended to the month CSV files, and
+    # inserted in the LedgerDB if any.
+    def append_transactions(self, rows, persist : bool = False):
+        df_rows = ledger_rows("cashflow", rows)
+        if (df_rows.index.year != self.YEAR).any():
+            raise ValueError(f"Transactions to append must all be of {self.YEAR}")
+        df_new = self.fx.convert(df_rows) if self.fx is not None else df_rows
+        if self.exact_cents:
+            df_new = add_cents(df_new)
+        if self.use_db(): # aggregates served by the db are taken before it gets the new rows
+            self.calc_account_sums()
+            self.calc_daily_flows()
+
+        df_year_cashflow = concat_ledgers([self.df_year_cashflow, df_new])
+        if not df_year_cashflow.index.is_monotonic_increasing:
+            df_year_cashflow = df_year_cashflow.sort_index(kind='stable')
+        self.df_year_cashflow = df_year_cashflow
+        self.ledger_index = None
+
+        if self.account_sums is not None:
+            self.account_sums = self.account_sums.add(df_new.groupby("Type", observed=True)[self.amount].sum(), fill_value=0)
+        if self.df_daily_flows is not None:
+            self.df_daily_flows = add_period_totals(self.df_daily_flows, flow_totals(df_new, self.amount, 'D'))
+        if self.df_balance_timeline is not None:
+            df_daily_delta = daily_account_sums(df_new, self.amount)
+            self.df_balance_timeline = apply_balance_deltas(self.df_balance_timeline, from_cents(df_daily_delta) if self.exact_cents else df_daily_delta)
+        self.memo = dict() # tables of the previous ledger version
+        self.ledger_version += 1
+        if not self.df_m_cashflow.empty:
+            m_delta = flow_totals(df_new, self.amount, 'ME')
+            self.df_m_cashflow = apply_cashflow_deltas(self.df_m_cashflow, from_cents(m_delta) if self.exact_cents else m_delta)
+            self.memo[("cashflow", self.ledger_version, self.as_of, 'ME')] = self.df_m_cashflow
+            self.df_last_month_cashflow = self.calc_curr_month_cashflow()
+
+        if persist:
+            FinImport(self.path, "cashflow").append_frame(df_rows.reset_index())
+            if self.db is not None:
+                self.db.insert("cashflow", df_rows)
+        Logger.info(f"Appended {len(df_new)} cashflow transactions")
+        return df_new
+
+    # Arrow IPC files other tools can memory-map, e.g. {dirpath}/2025_df_m_cashflow.arrow
+    def export_arrow(self, dirpath):
+        return export_frames(dirpath, str(self.YEAR), {
+            "df_year_cashflow": self.df_year_cashflow,
+            "df_m_cashflow": self.df_m_cashflow,
+            "df_last_month_cashflow": self.df_last_month_cashflow,
+        })
+
+
+# One FinCashflow per year (all years under path by default), all sliced
+# from a single sorted multi-year ledger load
+def load_cashflow_years(path: str, years = None, use_cache: bool = False, workers: int = 1, exact_cents: bool = False, as_of = None, currency: str = None):
+    df_ledger = load_ledger("cashflow", Path(path), years, use_cache, workers)
+    years = df_ledger.attrs["year_bounds"].keys()
+    as_of = resolve_as_of(as_of) # one date for all the years
+    return {YEAR: FinCashflow(path, YEAR, ledger=df_ledger, exact_cents=exact_cents, as_of=as_of, currency=currency) for YEAR in years}
@@ -0,0 +1,119 @@
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import json
+import re
+
+from .logger import Logger
+
+from .errors import *
+
+# Alternation of the keywords factored on common prefixes, e.g.
+# amazon, amazon prime -> amazon(?: prime)?
+def trie_pattern(keywords) -> str:
+    trie = dict()
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, dict())
+        node[''] = dict()
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char != '']
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f"(?:{body})?" if '' in node else body
+
+    return build(trie)
+
+class FinCategorizer:
+    """
+    Rule based Category/Subcategory assignment from the Description column.
+
+    Rules are read from a JSON file, in priority order:
+        [
+            {"pattern": "netflix", "category": "Subs", "subcategory": "Streaming"},
+            {"pattern": "^(ESSO|ENI) ", "regex": true, "category": "Transport", "subcategory": "Fuel"}
+        ]
+    Keyword rules match case-insensitively anywhere in the description. All the
+    keywords are compiled in one trie-shaped pattern tried at every position of
+    the lowercased description, so every distinct description is scanned once
+    whatever the number of rules. Regex rules are matched on their own.
+
+    Attributes:
+        rules (list): The rules, in priority order.
+        matcher (re.Pattern): The compiled keyword pattern.
+        keyword_rules (dict): Lowercased keyword -> best rule number among the keyword and its keyword prefixes.
+        regex_rules (list): (rule number, re.Pattern) of the regex rules.
+        categories (np.ndarray): Category of every rule.
+        subcategories (np.ndarray): Subcategory of every rule.
+    """
+    def __init__(self, rules_path: str = None, rules: list = None):
+        Logger.info("Initializing FinCategorizer class.")
+        if rules is None:
+            path_o = Path(rules_path)
+            if not path_o.exists():
+                Logger.error("Wrong path!")
+                raise PathError(f"Entered path {path_o} does not exist! Cannot load rules.")
+            with open(path_o) as file:
+                rules = json.loads(file.read())
+
+        self.rules : list = rules
+        self.categories = np.array([rule["category"] for rule in rules] + [''], dtype=object)
+        self.subcategories = np.array([rule.get("subcategory", '') for rule in rules] + [''], dtype=object)
+        self.compile_rules(rules)
+
+    def compile_rules(self, rules: list):
+        keywords = dict()
+        self.regex_rules : list = list()
+        for n, rule in enumerate(rules):
+            if rule.get("regex", False):
+                self.regex_rules.append((n, re.compile(rule["pattern"], re.IGNORECASE | re.DOTALL)))
+            elif rule["pattern"]:
+                keywords.setdefault(rule["pattern"].lower(), n)
+
+        # The pattern reports the longest keyword starting at each position, the
+        # shorter keywords it starts with also matched there
+        self.keyword_rules : dict = {
+            keyword: min(n for prefix, n in keywords.items() if keyword.startswith(prefix))
+            for keyword in keywords
+        }
+        self.matcher = re.compile(f"(?=({trie_pattern(keywords)}))", re.DOTALL) if keywords else None
+
+    # Rule number of every description, len(rules) when no rule matches
+    def match(self, descriptions: pd.Series):
+        codes, uniques = pd.factorize(descriptions.astype(object).fillna('').astype(str), use_na_sentinel=False)
+        no_rule = len(self.rules)
+        unique_rules = np.full(len(uniques), no_rule, dtype='int64')
+        if self.matcher is not None:
+            for i, description in enumerate(uniques):
+                found = [self.keyword_rules[m.group(1)] for m in self.matcher.finditer(description.lower())]
+                if found:
+                    unique_rules[i] = min(found)
+        for n, regex in self.regex_rules:
+            todo = np.flatnonzero(unique_rules > n)
+            hits = [i for i in todo if regex.search(uniques[i])]
+            unique_rules[hits] = n
+        return unique_rules[codes]
+
+    # Fills Category/Subcategory of the rows without a Category, or of all the
+    # rows with overwrite=True. Rows matching no rule are left untouched.
+    def categorize(self, df: pd.DataFrame, overwrite: bool = False):
+        if overwrite:
+            todo = np.ones(len(df), dtype=bool)
+        else:
+            todo = (df["Category"].astype(str).str.strip() == '').values | df["Category"].isna().values
+
+        rule_idx = np.full(len(df), len(self.rules), dtype='int64')
+        rule_idx[todo] = self.match(df["Description"].loc[todo])
+        matched = rule_idx < len(self.rules)
+
+        df = df.copy()
+        for column, values in (("Category", self.categories), ("Subcategory", self.subcategories)):
+            was_categorical = isinstance(df[column].dtype, pd.CategoricalDtype)
+            new_values = np.where(matched, values[rule_idx], df[column].astype(object).values)
+            df[column] = pd.Categorical(new_values) if was_categorical else new_values
+
+        Logger.info(f"Categorized {int(matched.sum())} of {int(todo.sum())} rows")
+        return df
@@ -0,0 +1,143 @@
+from typing import Dict
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+from .fin_cashflow import FinCashflow
+from .fin_investments import FinInvestments
+
+class FinChain:
+    """
+    A continuous multi-year timeline: every year is a FinCashflow (and a
+    FinInvestments) whose opening state is the closing state of the year
+    before, so only the first year needs its {YEAR}/{YEAR}_init.json.
+
+    What a year adds to its opening state (the per-account and per-symbol
+    sums, the daily flows) does not depend on it, so these are computed for
+    all years in parallel. Chaining the openings is then a sum of small dicts,
+    and the tables of every year are again built in parallel.
+
+        chain = FinChain(path, workers=4)
+        chain.run()
+        chain.df_nw # ten years of net worth
+
+    Attributes:
+        years (list): Chained years, in ascending order, up to the year of as_of.
+        init_holdings (dict): Init holdings of the first year.
+        openings (dict): Opening holdings of every year, with the same layout as init_holdings.
+        cashflows (dict): FinCashflow of every year.
+        investments (dict): FinInvestments of every year, empty with investments=False.
+        df_m_cashflow (pd.DataFrame): Monthly cashflow table of all years.
+        df_holdings (pd.DataFrame): Monthly holdings table of all years.
+        df_nw (pd.DataFrame): Monthly liquidity, investments and net worth of all years.
+    """
+    def __init__(self, path: str, years = None, use_cache: bool = False, workers: int = 1, exact_cents: bool = False, investments: bool = True, as_of = None):
+        Logger.info("Initializing FinChain class.")
+        path_o = Path(path)
+        if path_o.exists():
+            self.path = path_o
+        else:
+            Logger.error("Wrong path!")
+            raise PathError(f"Entered path {path_o} does not exist! Cannot load files.")
+
+        self.as_of : datetime = resolve_as_of(as_of)
+        years = list_years(self.path) if years is None else sorted(years)
+        self.years : list = [YEAR for YEAR in years if YEAR <= self.as_of.year]
+        self.workers : int = workers
+        self.exact_cents : bool = exact_cents
+
+        self.init_holdings : Dict[str, dict] = load_init_holdings(self.path, self.years[0])
+        if self.init_holdings is None:
+            Logger.error("Wrong path!")
+            raise PathError(f"{self.years[0]}_init.json of the first year does not exist! Cannot chain the years.")
+
+        df_cashflow = load_ledger("cashflow", self.path, self.years, use_cache, workers)
+        df_investments = load_ledger("investments", self.path, self.years, use_cache, workers) if investments else None
+        self.openings : Dict[int, dict] = self.chain_openings(df_cashflow, df_investments)
+
+        self.cashflows : Dict[int, FinCashflow] = {
+            YEAR: FinCashflow(self.path, YEAR, ledger=df_cashflow, exact_cents=exact_cents, as_of=self.as_of, init_holdings=self.openings[YEAR]) for YEAR in self.years
+        }
+        self.investments : Dict[int, FinInvestments] = dict()
+        if investments:
+            self.investments = {
+                YEAR: FinInvestments(self.path, YEAR, ledger=df_investments, as_of=self.as_of, init_holdings=self.openings[YEAR]) for YEAR in self.years
+            }
+
+        self.df_m_cashflow : pd.DataFrame = pd.DataFrame()
+        self.df_holdings : pd.DataFrame = pd.DataFrame()
+        self.df_nw : pd.DataFrame = pd.DataFrame()
+        pass
+
+    # task(YEAR) of every year, on a thread pool of `workers` threads
+    def map_years(self, task):
+        if self.workers > 1 and len(self.years) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                return dict(zip(self.years, pool.map(task, self.years)))
+        return {YEAR: task(YEAR) for YEAR in self.years}
+
+    # What a year adds to its opening state, whatever the opening state is
+    def year_sums(self, YEAR: int, df_cashflow: pd.DataFrame, df_investments: pd.DataFrame = None):
+        df_year_cashflow = ledger_year(df_cashflow, YEAR)
+        if self.exact_cents:
+            df_year_cashflow = add_cents(df_year_cashflow)
+        account_sums = df_year_cashflow.groupby("Type", observed=True)["Cents" if self.exact_cents else "Qty"].sum()
+        symbol_sums = pd.Series(dtype='float64')
+        if df_investments is not None:
+            symbol_sums = ledger_year(df_investments, YEAR).groupby(["Type", "Symbol"], observed=True)["Qty"].sum()
+        return account_sums, symbol_sums
+
+    # Opening of every year: the init json for the first one, then the
+    # closing balances and quantities of the year before
+    def chain_openings(self, df_cashflow: pd.DataFrame, df_investments: pd.DataFrame = None):
+        year_sums = self.map_years(lambda YEAR: self.year_sums(YEAR, df_cashflow, df_investments))
+        liquidity = dict(self.init_holdings['liquidity_eur'])
+        assets = {asset_class: dict(symbols) for asset_class, symbols in self.init_holdings['assets'].items()}
+
+        openings = dict()
+        for YEAR in self.years:
+            openings[YEAR] = {
+                "liquidity_eur": dict(liquidity),
+                "assets": {asset_class: dict(symbols) for asset_class, symbols in assets.items() if symbols},
+            }
+
+            account_sums, symbol_sums = year_sums[YEAR]
+            liquidity.update(build_balances(account_sums, {"liquidity_eur": liquidity}, self.exact_cents))
+            for (asset_class, symbol), qty in symbol_sums.items():
+                symbols = assets.setdefault(asset_class, dict())
+                symbols[symbol] = symbols.get(symbol, 0.0) + float(qty)
+                if abs(symbols[symbol]) < 1e-9: # sold out, no longer priced
+                    del symbols[symbol]
+        return openings
+
+    # Tables of every year, one below the other. The first row of every year
+    # is its opening, kept for the first year only.
+    def concat_years(self, frames: dict):
+        dfl = [df if i == 0 else df.iloc[1:] for i, df in enumerate(frames.values())]
+        return pd.concat(dfl)
+
+    # Cashflow table of all years at any frequency: 'ME', 'QE', 'YE'...
+    def calc_cashflow(self, freq: str = 'ME'):
+        return self.concat_years(self.map_years(lambda YEAR: self.cashflows[YEAR].calc_cashflow(freq)))
+
+    # Daily running balance of every account over all years
+    def calc_balance_timeline(self):
+        df_timeline = self.concat_years(self.map_years(lambda YEAR: self.cashflows[YEAR].calc_balance_timeline()))
+        return df_timeline.fillna(0.0) # accounts opened in a later year
+
+    def balance_as_of(self, date, account: str = None):
+        return balance_as_of(self.calc_balance_timeline(), date, account)
+
+    def run(self):
+        self.df_m_cashflow = self.calc_cashflow('ME')
+        if self.investments:
+            def run_year(YEAR):
+                self.investments[YEAR].run()
+                return self.investments[YEAR].df_year_holdings
+            self.df_holdings = self.concat_years(self.map_years(run_year))
+        self.df_nw = build_net_worth(self.df_m_cashflow, self.df_holdings)
+        pass
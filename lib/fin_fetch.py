@@ -12,8 +12,14 @@ user_agents = [
 ]
 
 class FinFetch:
-    def fetch_crypto_data(symbol, currency="EUR", years_watchback=3):
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}-{currency}?range={years_watchback}y&interval=1mo"
+    # as_of: last date of the history, today by default
+    def fetch_crypto_data(symbol, currency="EUR", years_watchback=3, as_of=None):
+        if as_of is None:
+            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}-{currency}?range={years_watchback}y&interval=1mo"
+        else:
+            period_end = int((as_of.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp())
+            period_start = int((as_of - relativedelta(years=years_watchback)).timestamp())
+            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}-{currency}?period1={period_start}&period2={period_end}&interval=1mo"
         headers = {'User-Agent': user_agents[0]} # Set the user agent to mimic a web browser, otherwise error 429 too many requests
         response = requests.get(url, headers=headers)
 
@@ -43,8 +49,37 @@ class FinFetch:
             print(url)
             return None
 
-    def fetch_etf_data(isin, currency="EUR", years_watchback=3):
-        today = datetime.now()
+    # Daily {coin} -> {currency} rates between start and end dates included
+    def fetch_fx_data(coin, currency="EUR", start=None, end=None):
+        period_start = int(pd.Timestamp(start).timestamp())
+        period_end = int((pd.Timestamp(end) + timedelta(days=1)).timestamp())
+        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{coin}{currency}=X?period1={period_start}&period2={period_end}&interval=1d"
+        headers = {'User-Agent': user_agents[0]} # Set the user agent to mimic a web browser, otherwise error 429 too many requests
+        response = requests.get(url, headers=headers)
+
+        if response.status_code == 200:
+            data = response.json()
+
+            timestamps = data['chart']['result'][0]['timestamp']
+            close_prices = data['chart']['result'][0]['indicators']['quote'][0]['close']
+
+            fx_history = pd.DataFrame({
+                'Date': pd.to_datetime(timestamps, unit='s').strftime('%Y-%m-%d'),
+                'Close': close_prices
+            })
+
+            fx_history['Date'] = pd.to_datetime(fx_history['Date'])
+            fx_history.set_index('Date',inplace=True)
+            fx_history = fx_history.dropna()
+            return fx_history.loc[~fx_history.index.duplicated(keep='last')]
+        else:
+            print(f"Error fetching data: {response.status_code}")
+            print(url)
+            return None
+
+    # as_of: last date of the history, today by default
+    def fetch_etf_data(isin, currency="EUR", years_watchback=3, as_of=None):
+        today = datetime.now() if as_of is None else as_of
         query_end_date = today.strftime('%Y-%m-%d')
         query_start_date = ( today - relativedelta(years=years_watchback) ).strftime('%Y-%m-%d')
 
@@ -79,16 +114,25 @@ class FinFetch:
             print(f"Error fetching data: {response.status_code}")
             return None
 
-    def fetch_crypto_data_today(symbol, currency="EUR", years_watchback=1):
-        # Now get real time market data
-        url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}-{currency}?range={years_watchback}y&interval=1d"
+    # as_of: the last close up to that date instead of the real time price
+    def fetch_crypto_data_today(symbol, currency="EUR", years_watchback=1, as_of=None):
+        if as_of is None: # Now get real time market data
+            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}-{currency}?range={years_watchback}y&interval=1d"
+        else:
+            period_end = int((as_of.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp())
+            period_start = period_end - 7*24*3600 # a week, in case of missing days
+            url = f"https://query1.finance.yahoo.com/v8/finance/chart/{symbol}-{currency}?period1={period_start}&period2={period_end}&interval=1d"
         headers = {'User-Agent': user_agents[0]} # Set the user agent to mimic a web browser, otherwise error 429 too many requests
         response = requests.get(url, headers=headers)
         if response.status_code == 200:
             data = response.json()
 
-            timestamp = data['chart']['result'][0]['meta']['regularMarketTime']
-            close_price = data['chart']['result'][0]['meta']['regularMarketPrice']
+            if as_of is None:
+                timestamp = data['chart']['result'][0]['meta']['regularMarketTime']
+                close_price = data['chart']['result'][0]['meta']['regularMarketPrice']
+            else:
+                closes = pd.Series(data['chart']['result'][0]['indicators']['quote'][0]['close'], index=data['chart']['result'][0]['timestamp']).dropna()
+                timestamp, close_price = closes.index[-1], closes.iloc[-1]
 
             asset_today = pd.DataFrame({
                 'Date': [pd.to_datetime(timestamp, unit='s').strftime('%Y-%m-%d')],
@@ -105,8 +149,9 @@ class FinFetch:
             print(url)
             return None
 
-    def fetch_etf_data_today(isin, currency="EUR"):
-        today = datetime.now()
+    # as_of: the last close up to that date instead of the latest quote
+    def fetch_etf_data_today(isin, currency="EUR", as_of=None):
+        today = datetime.now() if as_of is None else as_of
         query_end_date = today.strftime('%Y-%m-%d')
         query_start_date = ( today - relativedelta(months=1) ).strftime('%Y-%m-%d')
 
@@ -117,8 +162,12 @@ class FinFetch:
         if response.status_code == 200:
             data = response.json()
 
-            close_price = data['latestQuote']['raw']
-            date = data['latestQuoteDate']
+            if as_of is None:
+                close_price = data['latestQuote']['raw']
+                date = data['latestQuoteDate']
+            else:
+                close_price = data['series'][-1]['value']['raw']
+                date = data['series'][-1]['date']
 
             asset_today = pd.DataFrame({
                 'Date': [date],
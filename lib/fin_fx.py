@@ -0,0 +1,124 @@
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+from .fin_fetch import FinFetch
+
+class FinFX:
+    """
+    Conversion of a cashflow ledger with several currencies (Coin column)
+    into a single reporting currency.
+
+    Daily rates are cached like the asset prices, one file per currency pair
+    and year: {path}/{YEAR}/cashflow/exchange/{COIN}-{CURRENCY}.csv with
+    Date,Close columns, fetched when missing or outdated. Every row gets the
+    last rate known on its date from one merge_asof over all the pairs at
+    once (by Coin), so the cost is a sort whatever the number of rows.
+
+        fx = FinFX(path, 2025, "EUR")
+        df_converted = fx.convert(df_year_cashflow)
+
+    Attributes:
+        path (Path): Root of the data tree.
+        currency (str): Reporting currency.
+        rates (dict): Coin -> daily rates to the reporting currency, loaded once.
+    """
+    STALE_DAYS = 3 # no rates on weekends and bank holidays
+
+    def __init__(self, path: str, YEAR: int, currency: str = "EUR", as_of = None, fetch: bool = True):
+        Logger.info("Initializing FinFX class.")
+        path_o = Path(path)
+        if path_o.exists():
+            self.path = path_o
+        else:
+            Logger.error("Wrong path!")
+            raise PathError(f"Entered path {path_o} does not exist! Cannot load rates.")
+
+        self.YEAR : int = YEAR
+        self.currency : str = currency
+        self.as_of : datetime = resolve_as_of(as_of)
+        self.fetch : bool = fetch
+        self.rates : dict = dict()
+
+    def rates_path(self, coin: str):
+        return Path(f"{self.path}/{self.YEAR}/cashflow/exchange/{coin}-{self.currency}.csv")
+
+    # Daily rates of coin, from a week before the year (first rows of January
+    # need the last rate of December) to the end of the year or as_of
+    def get_rates(self, coin: str):
+        if coin in self.rates:
+            return self.rates[coin]
+        start = pd.Timestamp(f"{self.YEAR-1}-12-24")
+        end = min(pd.Timestamp(f"{self.YEAR}-12-31"), pd.Timestamp(self.as_of).normalize())
+        filepath = self.rates_path(coin)
+
+        df_rates = None
+        if filepath.exists():
+            df_rates = pd.read_csv(filepath, index_col=0, parse_dates=True)
+            if df_rates.index[-1] >= end - pd.Timedelta(days=self.STALE_DAYS):
+                Logger.info(f"{filepath} already exists. Data Loaded from local.")
+                self.rates[coin] = df_rates
+                return df_rates
+        if self.fetch:
+            Logger.info(f"Fetching {coin}-{self.currency} rates")
+            df_update = FinFetch.fetch_fx_data(coin, self.currency, start, end)
+            if df_update is not None:
+                df_rates = df_update if df_rates is None else pd.concat([df_rates, df_update.loc[df_update.index > df_rates.index[-1]]])
+                filepath.parent.mkdir(parents=True, exist_ok=True)
+                df_rates.to_csv(filepath)
+                Logger.info(f"Rates saved in local to {filepath}")
+        if df_rates is None:
+            raise ValueError(f"No {coin}-{self.currency} rates in {filepath} and none could be fetched")
+        self.rates[coin] = df_rates
+        return df_rates
+
+    # Long table Date, Coin, Rate of the given coins, sorted by date
+    def rate_table(self, coins):
+        dfl = list()
+        for coin in coins:
+            df_rates = self.get_rates(coin)
+            dfl.append(pd.DataFrame({"Date": df_rates.index.values.astype('datetime64[ns]'), "Coin": coin, "Rate": df_rates["Close"].values.astype('float64')}))
+        return pd.concat(dfl, ignore_index=True).sort_values("Date", kind='stable')
+
+    # Rate of every row to the reporting currency, 1 for rows already in it
+    def row_rates(self, dates, coins: np.ndarray):
+        rates = np.ones(len(coins))
+        foreign = coins != self.currency
+        if not foreign.any():
+            return rates
+        df_left = pd.DataFrame({"Date": dates[foreign], "Coin": coins[foreign], "pos": np.flatnonzero(foreign)})
+        df_left = df_left.sort_values("Date", kind='stable')
+        df_merged = pd.merge_asof(df_left, self.rate_table(pd.unique(coins[foreign])), on="Date", by="Coin", direction="backward")
+        missing = df_merged["Rate"].isna()
+        if missing.any():
+            first = df_merged.loc[missing].iloc[0]
+            raise ValueError(f"No {first['Coin']}-{self.currency} rate on or before {first['Date'].date()}")
+        rates[df_merged["pos"].values] = df_merged["Rate"].values
+        return rates
+
+    # Qty in the reporting currency rounded to cents, Coin set to it. The
+    # amounts as written are kept in OrigQty and OrigCoin.
+    def convert(self, df: pd.DataFrame):
+        coins = df["Coin"].astype(str).str.strip().values
+        coins = np.where(coins == "", "EUR", coins) # rows without Coin are in EUR, as everywhere else
+        rates = self.row_rates(df.index.values.astype('datetime64[ns]'), coins)
+        df_converted = df.assign(
+            Qty=np.round(df["Qty"].values * rates, 2),
+            Coin=pd.Categorical([self.currency] * len(df)),
+            OrigQty=df["Qty"].values,
+            OrigCoin=df["Coin"].values,
+        )
+        return df_converted
+
+    # Init holdings with the opening liquidity (in EUR) converted at the rate
+    # of the last day of the previous year
+    def convert_holdings(self, init_holdings: dict):
+        if self.currency == "EUR" or init_holdings is None:
+            return init_holdings
+        rate = self.row_rates(np.array([np.datetime64(f"{self.YEAR-1}-12-31", 'ns')]), np.array(["EUR"]))[0]
+        liquidity = {cc: round(float(val * rate), 2) for cc, val in init_holdings['liquidity_eur'].items()}
+        return {**init_holdings, 'liquidity_eur': liquidity}
@@ -0,0 +1,215 @@
+from pathlib import Path
+import pandas as pd
+import numpy as np
+import os
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+
+class FinImport:
+    """
+    Bulk import of bank/broker statement exports into the month CSV files.
+
+    Statements are streamed in chunks, renamed to the column layout load_data
+    expects and appended to {YEAR}/{typedata}/{YEAR}-MM_{typedata}.csv. A
+    persistent per-year hash index of the imported transactions makes
+    re-importing overlapping statement periods skip what is already there,
+    without reading the existing month files again.
+
+    Attributes:
+        path (Path): Root of the data tree.
+        typedata (str): Either cashflow or investments.
+        column_map (dict): Statement column -> ledger column renames.
+        defaults (dict): Values of ledger columns missing from the statement, e.g. Type.
+        categorizer (FinCategorizer): Optional rules filling Category/Subcategory.
+        indexes (dict): Per-year sorted uint64 array of known transaction hashes.
+    """
+    LAYOUTS = {
+        "cashflow": ["Date", "Type", "Qty", "Coin", "Category", "Subcategory", "Description"],
+        "investments": ["Date", "Type", "Symbol", "Qty", "Category", "Subcategory", "Description"],
+    }
+    HASH_KEYS = {
+        "cashflow": ["Date", "Type", "Qty", "Description"],
+        "investments": ["Date", "Type", "Symbol", "Qty", "Description"],
+    }
+    QTY_SCALE = 10**8 # quantities are hashed as integers, crypto amounts need 8 decimals
+
+    def __init__(self, path: str, typedata: str = "cashflow", column_map: dict = None, defaults: dict = None, chunksize: int = 100_000, categorizer = None):
+        Logger.info("Initializing FinImport class.")
+        path_o = Path(path)
+        if path_o.exists():
+            self.path = path_o
+        else:
+            Logger.error("Wrong path!")
+            raise PathError(f"Entered path {path_o} does not exist! Cannot import files.")
+        if typedata not in self.LAYOUTS:
+            raise TypeDataError(f"Type data is not either cashflow or investments")
+
+        self.typedata : str = typedata
+        self.column_map : dict = column_map or dict()
+        self.defaults : dict = {"Coin": "EUR"} if typedata == "cashflow" else dict()
+        self.defaults.update(defaults or dict())
+        self.chunksize : int = chunksize
+        self.float_format : str = "%.2f" if typedata == "cashflow" else None
+        self.categorizer = categorizer # optional FinCategorizer for uncategorized rows
+        self.indexes : dict = dict()
+        self.seen_counts : dict = dict() # per-year occurrences of every key in the current statement
+
+    def index_path(self, YEAR: int):
+        return self.path / f"{YEAR}" / self.typedata / ".import_index.npy"
+
+    # Hash of the key columns of every row
+    def key_hashes(self, df: pd.DataFrame):
+        df_key = pd.DataFrame({
+            column: df[column].astype(str).str.strip() for column in self.HASH_KEYS[self.typedata] if column not in ("Date", "Qty")
+        })
+        df_key["Date"] = df["Date"].dt.strftime('%Y-%m-%d').values
+        df_key["Qty"] = np.rint(df["Qty"].values.astype('float64') * self.QTY_SCALE).astype('int64')
+        return pd.util.hash_pandas_object(df_key, index=False).values
+
+    def occurrence_hashes(self, base: np.ndarray, occurrence: np.ndarray):
+        return pd.util.hash_pandas_object(pd.DataFrame({"h": base, "n": occurrence}), index=False).values
+
+    # Hash of the key columns plus the occurrence number of that key, so that
+    # two identical transactions of the same day are both kept, once.
+    # seen_counts: occurrences of the keys before these rows.
+    def hash_rows(self, df: pd.DataFrame, seen_counts: pd.Series):
+        base = self.key_hashes(df)
+        base_s = pd.Series(base)
+        prior = base_s.map(seen_counts).fillna(0).astype('int64').values
+        occurrence = base_s.groupby(base).cumcount().values + prior
+        seen_counts = seen_counts.add(base_s.value_counts(), fill_value=0)
+        return self.occurrence_hashes(base, occurrence), seen_counts
+
+    # Mask of the hashes present in a sorted index
+    def in_index(self, index: np.ndarray, hashes: np.ndarray):
+        if not len(index):
+            return np.zeros(len(hashes), dtype=bool)
+        pos = np.minimum(np.searchsorted(index, hashes), len(index) - 1)
+        return index[pos] == hashes
+
+    # Occurrences of every key already recorded in the index: the first
+    # occurrence number of the key missing from it
+    def index_counts(self, index: np.ndarray, base: np.ndarray):
+        keys = np.unique(base)
+        counts = np.zeros(len(keys), dtype='int64')
+        pending = np.arange(len(keys))
+        while len(pending):
+            known = self.in_index(index, self.occurrence_hashes(keys[pending], counts[pending]))
+            pending = pending[known]
+            counts[pending] += 1
+        return pd.Series(counts, index=keys)
+
+    # The index of a year is built from its month files only the first time
+    def load_index(self, YEAR: int):
+        if YEAR in self.indexes:
+            return self.indexes[YEAR]
+        index_path = self.index_path(YEAR)
+        if index_path.exists():
+            index = np.load(index_path)
+        else:
+            Logger.info(f"Building import hash index of {YEAR} {self.typedata}")
+            try:
+                df_year = load_data(self.typedata, self.path, YEAR).reset_index()
+                hashes, _ = self.hash_rows(df_year, pd.Series(dtype='int64'))
+                index = np.unique(hashes)
+            except ValueError: # no month file yet
+                index = np.array([], dtype='uint64')
+        self.indexes[YEAR] = index
+        return index
+
+    def save_indexes(self):
+        for YEAR, index in self.indexes.items():
+            index_path = self.index_path(YEAR)
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(index_path, index)
+
+    # Renames statement columns and fills the ledger layout
+    def normalize(self, df: pd.DataFrame, date_format: str = None):
+        df = df.rename(columns=lambda c: c.strip()).rename(columns=self.column_map)
+        layout = self.LAYOUTS[self.typedata]
+        for column in layout:
+            if column not in df.columns:
+                df[column] = self.defaults.get(column, '')
+        df = df[layout].copy()
+        df["Date"] = pd.to_datetime(df["Date"], format=date_format)
+        df["Qty"] = pd.to_numeric(df["Qty"])
+        for column in layout[1:]:
+            if df[column].dtype == object:
+                df[column] = df[column].fillna('').astype(str).str.strip()
+        if self.categorizer is not None:
+            df = self.categorizer.categorize(df)
+        return df
+
+    def append_month(self, YEAR: int, month: int, df_month: pd.DataFrame):
+        filepath = self.path / f"{YEAR}" / self.typedata / f"{YEAR}-{month:0=2}_{self.typedata}.csv"
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        df_month = df_month.assign(Date=df_month["Date"].dt.strftime('%Y-%m-%d'))
+        if filepath.exists():
+            with open(filepath) as file:
+                columns = [c.strip() for c in file.readline().rstrip("\r\n").split(",")]
+            needs_newline = False
+            with open(filepath, "rb") as file:
+                if file.seek(0, os.SEEK_END) > 0:
+                    file.seek(-1, os.SEEK_END)
+                    needs_newline = file.read(1) != b"\n"
+            with open(filepath, "a") as file:
+                if needs_newline:
+                    file.write("\n")
+                df_month.reindex(columns=columns, fill_value='').to_csv(file, header=False, index=False, float_format=self.float_format)
+        else:
+            df_month.to_csv(filepath, index=False, float_format=self.float_format)
+
+    def append_months(self, df: pd.DataFrame):
+        for (YEAR, month), df_month in df.groupby([df["Date"].dt.year, df["Date"].dt.month]):
+            self.append_month(YEAR, month, df_month)
+
+    # Appends rows entered by hand, all of them. Years with a hash index get
+    # them recorded, so a later statement holding them does not add them twice.
+    def append_frame(self, df: pd.DataFrame):
+        for YEAR, df_year in df.groupby(df["Date"].dt.year):
+            self.append_months(df_year)
+            if YEAR in self.indexes or self.index_path(YEAR).exists():
+                index = self.load_index(YEAR)
+                # numbered after the identical rows already recorded
+                hashes, _ = self.hash_rows(df_year, self.index_counts(index, self.key_hashes(df_year)))
+                self.indexes[YEAR] = np.union1d(index, hashes)
+        self.save_indexes()
+
+    def import_chunk(self, df: pd.DataFrame):
+        new_rows = 0
+        for YEAR, df_year in df.groupby(df["Date"].dt.year):
+            index = self.load_index(YEAR)
+            seen_counts = self.seen_counts.get(YEAR, pd.Series(dtype='int64'))
+            hashes, self.seen_counts[YEAR] = self.hash_rows(df_year, seen_counts)
+            known = self.in_index(index, hashes)
+            df_new = df_year.loc[~known]
+            if df_new.empty:
+                continue
+
+            self.append_months(df_new)
+            self.indexes[YEAR] = np.union1d(index, hashes[~known])
+            new_rows += len(df_new)
+        return new_rows
+
+    # Appends the transactions of a normalized frame not already imported,
+    # returns the number of new rows
+    def import_frame(self, df: pd.DataFrame):
+        self.seen_counts = dict() # occurrences are counted per statement
+        new_rows = self.import_chunk(df)
+        self.save_indexes()
+        return new_rows
+
+    def import_statement(self, filepath: str, date_format: str = None, **read_csv_kwargs):
+        self.seen_counts = dict() # occurrences are counted per statement
+        new_rows, total_rows = 0, 0
+        with pd.read_csv(filepath, chunksize=self.chunksize, **read_csv_kwargs) as reader:
+            for chunk in reader:
+                df = self.normalize(chunk, date_format)
+                new_rows += self.import_chunk(df)
+                total_rows += len(df)
+        self.save_indexes()
+        Logger.info(f"Imported {new_rows} new of {total_rows} rows from {filepath}")
+        return new_rows
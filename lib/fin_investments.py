@@ -11,6 +11,8 @@ from .commonlib import *
 from .errors import *
 
 from .fin_fetch import FinFetch
+from .fin_arrow import export_frames
+from .fin_import import FinImport
 
 class FinInvestments:
     """
@@ -19,8 +21,12 @@ class FinInvestments:
     Attributes:
         init_holdings (dict): A dictionary to store initial holdings.
         df_year_investments (pd.DataFrame): DataFrame to track yearly investments.
+        ledger_version (int): Number of appends applied to the ledger since it was loaded.
+        df_holdings_monthlyized (pd.DataFrame): Month end Qty and CumQty, columns (Type, Symbol, Qty|CumQty).
+        as_of (datetime): Date the tables are evaluated at, the wall clock at init by default.
+        memo (dict): Results already computed, keyed by (result, ledger version, as_of).
     """
-    def __init__(self, path: str, YEAR: int):
+    def __init__(self, path: str, YEAR: int, use_cache: bool = False, workers: int = 1, db = None, ledger: pd.DataFrame = None, as_of = None, init_holdings: dict = None):
         Logger.info("Initializing FinInvestmeents class.")
         path_o = Path(path)
         if path_o.exists():
@@ -30,12 +36,28 @@ class FinInvestments:
             raise PathError(f"Entered path {path_o} does not exist! Cannot load files.")
 
         self.YEAR : int = YEAR
-        self.init_holdings : Dict[str, float] = load_init_holdings(self.path, self.YEAR)
-        self.df_year_investments : pd.DataFrame = load_data("investments", self.path, self.YEAR)
+        if init_holdings is None:
+            init_holdings = load_init_holdings(self.path, self.YEAR)
+        self.init_holdings : Dict[str, float] = init_holdings # from the init json unless given, e.g. chained by FinChain
+        self.db = db # optional LedgerDB to load the ledger from
+        if ledger is not None: # slice of a multi-year ledger, see load_investments_years
+            self.df_year_investments : pd.DataFrame = ledger_year(ledger, self.YEAR)
+        elif self.db is not None:
+            self.df_year_investments : pd.DataFrame = self.db.load_year("investments", self.YEAR)
+        else:
+            self.df_year_investments : pd.DataFrame = load_data("investments", self.path, self.YEAR, use_cache, workers)
         self.assets : Dict[str, Dict[str, pd.DataFrame]]
         self.df_year_holdings : pd.DataFrame = pd.DataFrame()
+        self.ledger_version : int = 0 # bumped by every append_transactions
+        self.as_of : datetime = resolve_as_of(as_of) # read once, so that all the tables agree on "today"
+        self.memo : dict = dict()
+        self.init_merged : bool = False # init holdings rows already in df_year_investments
         pass
 
+    # The date to evaluate at: as_of if given, otherwise the one of the instance
+    def resolve(self, as_of = None):
+        return self.as_of if as_of is None else resolve_as_of(as_of)
+
     def get_init_holdings_to_df(self):
         rows = list()
         for asset_class in self.init_holdings['assets'].keys():
@@ -59,44 +81,25 @@ class FinInvestments:
         df_init_investments = pd.concat(rows)
         return df_init_investments
 
-    # For each symbol of each asset class, initializes the date index series
-    # as dates from january till december with zero values, and then updates it
-    # with imported values from df_year_investments
-    def get_holdings_monthlyized(self):
-        df_year_investments = self.df_year_investments
+    # Quantities at every month end from the last day of the previous year,
+    # for all symbols at once (see build_holdings_monthlyized). Returned as
+    # {asset class: {symbol: frame}}, the matrix is kept in df_holdings_monthlyized.
+    def get_holdings_monthlyized(self, as_of = None):
         start_date = f"{self.YEAR-1}-12-31" # for init_holdings
-        end_date = define_end_date(self.YEAR)
+        end_date = define_end_date(self.YEAR, self.resolve(as_of))
         complete_index = pd.date_range(start=start_date, end=end_date, freq='ME') # End of month
-        df_month_fill = pd.DataFrame(index=complete_index, data=0.0, columns=["Qty"], dtype='float64')
 
-        holdings_monthlyized = dict()
-        asset_classes = df_year_investments["Type"].unique()
-        for asset_class in asset_classes:
-            holdings_monthlyized_per_symbol = dict()
-            symbols = df_year_investments.loc[df_year_investments["Type"]==asset_class]["Symbol"].unique()
-            for symbol in symbols:
-                df_year_investments_query_asset_class = df_year_investments.loc[ df_year_investments.Type == asset_class ]
-                df_symbol_transactions = df_year_investments_query_asset_class.loc[ df_year_investments_query_asset_class.Symbol == symbol ]
-                
-                # Monthlyized quantities to end of month
-                df_month_invest = df_symbol_transactions.resample(rule='ME')['Qty'].sum().to_frame(name='Qty')
-                
-                temp_fill = df_month_fill.copy()
-                temp_fill.update(df_month_invest)
-                temp_fill['CumQty'] = temp_fill.values.cumsum()
-                holdings_monthlyized_per_symbol[symbol] = temp_fill
-            
-            holdings_monthlyized[asset_class] = holdings_monthlyized_per_symbol
-        
-        self.holdings_monthlyized = holdings_monthlyized
-        return holdings_monthlyized
+        self.df_holdings_monthlyized = build_holdings_monthlyized(self.df_year_investments, complete_index)
+        self.holdings_monthlyized = holdings_dict(self.df_holdings_monthlyized)
+        return self.holdings_monthlyized
 
     # For each symbol of each asset class, load historical data
     # with monthly resolution
-    def get_assets_monthlyized(self, holdings_monthlyized):
+    def get_assets_monthlyized(self, holdings_monthlyized, as_of = None):
         currency = 'EUR'
         years_watchback = 5
-        end_date = define_end_date(self.YEAR)
+        as_of = self.resolve(as_of)
+        end_date = define_end_date(self.YEAR, as_of)
 
         assets_monthlyized = dict()
         for asset_class in holdings_monthlyized.keys():
@@ -106,9 +109,9 @@ class FinInvestments:
 
                 if not os.path.exists(maket_data_path):
                     if asset_class == "Cryptocurrencies":
-                        asset_history = FinFetch.fetch_crypto_data(symbol, currency, years_watchback)
+                        asset_history = FinFetch.fetch_crypto_data(symbol, currency, years_watchback, as_of)
                     elif asset_class == "ETFs":
-                        asset_history = FinFetch.fetch_etf_data(symbol, currency, years_watchback)
+                        asset_history = FinFetch.fetch_etf_data(symbol, currency, years_watchback, as_of)
                     time.sleep(random.uniform(5,7)) # sleep for preventing status resp 500 (ip addres based limitation)
                     
                     asset_history = asset_history.loc[f'{self.YEAR-1}-12-31':end_date]
@@ -117,15 +120,15 @@ class FinInvestments:
                 else:
                     asset_history = pd.read_csv(maket_data_path, index_col=0, parse_dates=True)
                     last_date_str = asset_history.index[-1].strftime("%Y-%m-%d")
-                    if last_date_str < define_end_date(self.YEAR):
+                    if last_date_str < end_date:
                         Logger.info("New data must be downloaded")
                         if asset_class == "Cryptocurrencies":
-                            update = FinFetch.fetch_crypto_data(symbol, currency, years_watchback=1)
+                            update = FinFetch.fetch_crypto_data(symbol, currency, years_watchback=1, as_of=as_of)
                         elif asset_class == "ETFs":
-                            update = FinFetch.fetch_etf_data(symbol, currency, years_watchback=1)
+                            update = FinFetch.fetch_etf_data(symbol, currency, years_watchback=1, as_of=as_of)
                         time.sleep(random.uniform(5,7)) # sleep for preventing status resp 500 (ip addres based limitation)
                         
-                        df_update_red = update.loc[last_date_str:define_end_date(self.YEAR)]
+                        df_update_red = update.loc[last_date_str:end_date]
                         # always exclude first row which is redundant for pd.concat
                         df_update = df_update_red.loc[ df_update_red.index != df_update_red.index[0] ]
                         
@@ -136,6 +139,7 @@ class FinInvestments:
                     else:
                         Logger.info(f"{maket_data_path} already exists. Data Loaded from local.")
                         Logger.info(f"No need for update.")
+                        asset_history = asset_history.loc[:end_date] # prices known at as_of only
                 
                 asset_history["Returns"] = (asset_history["Close"] - asset_history.shift(1)["Close"] )/ asset_history["Close"]
                 assets_per_class[symbol] = asset_history
@@ -175,20 +179,83 @@ class FinInvestments:
         df_year_holdings['Total'] = df_year_holdings.sum(axis=1)
         return df_year_holdings
 
-    def run(self):
-        df_init_investments = self.get_init_holdings_to_df()
-        self.df_year_investments = pd.concat([df_init_investments, self.df_year_investments])
-        holdings_monthlyized = self.get_holdings_monthlyized()
-        assets_monthlyized = self.get_assets_monthlyized(holdings_monthlyized)
-        assets = self.get_assets_global(assets_monthlyized, holdings_monthlyized)
-        self.df_year_holdings = self.get_total_holdings(assets)
+    # run(as_of="2025-06-15") sets the date of the instance and rebuilds the
+    # holdings of that day, from the memo when already computed
+    def run(self, as_of = None):
+        if as_of is not None:
+            self.as_of = resolve_as_of(as_of)
+        if not self.init_merged:
+            df_init_investments = self.get_init_holdings_to_df()
+            self.df_year_investments = concat_ledgers([df_init_investments, self.df_year_investments])
+            self.init_merged = True
+        key = ("run", self.ledger_version, self.as_of)
+        if key not in self.memo:
+            holdings_monthlyized = self.get_holdings_monthlyized()
+            assets_monthlyized = self.get_assets_monthlyized(holdings_monthlyized)
+            assets = self.get_assets_global(assets_monthlyized, holdings_monthlyized)
+            self.memo[key] = (self.df_holdings_monthlyized, holdings_monthlyized, assets_monthlyized, self.get_total_holdings(assets))
+        self.df_holdings_monthlyized, self.holdings_monthlyized, self.assets_monthlyized, self.df_year_holdings = self.memo[key]
         pass
 
+    # Adds transactions (list of dicts or frame with the month file columns)
+    # and updates the monthly holdings and the holdings table of the touched
+    # symbols only. A new symbol gets its value in the table at the next run(),
+    # which fetches its prices. persist=True also appends them to the month CSV files.
+    def append_transactions(self, rows, persist : bool = False):
+        df_new = ledger_rows("investments", rows)
+        if (df_new.index.year != self.YEAR).any():
+            raise ValueError(f"Transactions to append must all be of {self.YEAR}")
+
+        df_year_investments = concat_ledgers([self.df_year_investments, df_new])
+        if not df_year_investments.index.is_monotonic_increasing:
+            df_year_investments = df_year_investments.sort_index(kind='stable')
+        self.df_year_investments = df_year_investments
+
+        self.memo = dict() # results of the previous ledger version
+        self.ledger_version += 1
+        if hasattr(self, "df_holdings_monthlyized"):
+            complete_index = self.df_holdings_monthlyized.index
+            self.df_holdings_monthlyized, touched = apply_holdings_deltas(self.df_holdings_monthlyized, df_new, complete_index)
+            self.holdings_monthlyized = holdings_dict(self.df_holdings_monthlyized)
+            if not self.df_year_holdings.empty:
+                self.df_year_holdings = self.df_year_holdings.copy()
+                self.update_holdings_table(touched)
+                self.memo[("run", self.ledger_version, self.as_of)] = (
+                    self.df_holdings_monthlyized, self.holdings_monthlyized, self.assets_monthlyized, self.df_year_holdings
+                )
+
+        if persist:
+            FinImport(self.path, "investments").append_frame(df_new.reset_index())
+            if self.db is not None:
+                self.db.insert("investments", df_new)
+        Logger.info(f"Appended {len(df_new)} investments transactions")
+        return df_new
+
+    # Recomputes the holdings columns of the given (asset class, symbol) pairs
+    def update_holdings_table(self, touched):
+        for asset_class, symbol in touched:
+            asset_history = self.assets_monthlyized.get(asset_class, dict()).get(symbol)
+            if asset_history is None:
+                Logger.warning(f"No prices of {symbol} yet, run() to fetch them")
+                continue
+            assets = self.get_assets_global(
+                {asset_class: {symbol: asset_history}}, {asset_class: {symbol: self.holdings_monthlyized[asset_class][symbol]}}
+            )
+            self.df_year_holdings[symbol] = assets[asset_class][symbol]["Holdings"].reindex(self.df_year_holdings.index)
+        self.df_year_holdings['Total'] = self.df_year_holdings.drop(columns='Total').sum(axis=1)
+
+    # Arrow IPC files other tools can memory-map, e.g. {dirpath}/2025_df_year_holdings.arrow
+    def export_arrow(self, dirpath):
+        return export_frames(dirpath, str(self.YEAR), {
+            "df_year_investments": self.df_year_investments,
+            "df_year_holdings": self.df_year_holdings,
+        })
+
     # ---------------- REAL TIME UPDATES ---------------------------
     def get_current_holdings(self):
         df_year_investments = self.df_year_investments
         holdings_monthlyized = self.holdings_monthlyized
-        today_date_str, today_month_str, today = define_today_date()
+        today_date_str, today_month_str, today = define_today_date(self.as_of)
         #df_year_investments.loc[today_month_str]
 
         complete_index = pd.date_range(start=today_month_str, end=today_date_str, freq='D') # End of month
@@ -224,9 +291,9 @@ class FinInvestments:
             for symbol in current_holdings[asset_class].keys():
                 print(f"Getting {symbol} today {currency} price...")
                 if asset_class == "Cryptocurrencies":
-                    asset_today = FinFetch.fetch_crypto_data_today(symbol, currency)
+                    asset_today = FinFetch.fetch_crypto_data_today(symbol, currency, as_of=self.as_of)
                 elif asset_class == "ETFs":
-                    asset_today = FinFetch.fetch_etf_data_today(symbol, currency)
+                    asset_today = FinFetch.fetch_etf_data_today(symbol, currency, as_of=self.as_of)
                 time.sleep(random.uniform(5,7)) # sleep for preventing status resp 500 (ip addres based limitation)
                 
                 prev_month_close = float(assets_monthlyized[asset_class][symbol].iloc[-1].Close)
@@ -262,7 +329,16 @@ class FinInvestments:
         df_year_holdings['Total'] = df_year_holdings.sum(axis=1)
         return df_year_holdings
 
-    def last_update_run(self):
+    # Holdings on as_of (the date of the instance by default), fetched once
+    # per ledger version and date
+    def last_update_run(self, as_of = None):
+        as_of = self.resolve(as_of)
+        if as_of != self.as_of: # month end holdings and prices of that date first
+            self.run(as_of)
+        key = ("today_holdings", self.ledger_version, self.as_of)
+        if key in self.memo:
+            return self.memo[key]
+
         current_holdings = self.get_current_holdings()
         assets_current_day = self.get_current_assets_price(current_holdings)
         assets_global_current_day = self.get_current_assets_holdings(assets_current_day, current_holdings)
@@ -280,4 +356,14 @@ class FinInvestments:
         Logger.debug("\n assets_global_current_day:\n%s", assets_global_current_day)
         Logger.debug("\n df_today_holdings:\n%s", df_today_holdings.to_string())
 
-        return df_today_holdings
\ No newline at end of file
+        self.memo[key] = df_today_holdings
+        return df_today_holdings
+
+
+# One FinInvestments per year (all years under path by default), all sliced
+# from a single sorted multi-year ledger load
+def load_investments_years(path: str, years = None, use_cache: bool = False, workers: int = 1, as_of = None):
+    df_ledger = load_ledger("investments", Path(path), years, use_cache, workers)
+    years = df_ledger.attrs["year_bounds"].keys()
+    as_of = resolve_as_of(as_of) # one date for all the years
+    return {YEAR: FinInvestments(path, YEAR, ledger=df_ledger, as_of=as_of) for YEAR in years}
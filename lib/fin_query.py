@@ -0,0 +1,77 @@
+import pandas as pd
+import numpy as np
+
+from .logger import Logger
+
+class LedgerIndex:
+    """
+    Positional indexes over a date sorted ledger, answering slicing queries
+    without boolean masks over the whole ledger.
+
+    Date ranges are resolved by binary search on the sorted index, labels of
+    the indexed columns map to the ascending row positions holding them, so
+    e.g. all Groceries of Q2 is one intersection of a label's positions with
+    a date range.
+
+        index = LedgerIndex(df_year_cashflow)
+        index.select(period="2025-03")
+        index.select(period="2025Q2", Category="Groceries")
+        index.select("2025-01-10", "2025-02-20", Type=["Hype", "Revolut"])
+
+    Attributes:
+        df (pd.DataFrame): The ledger, sorted by date.
+        dates (np.ndarray): Row dates as int64 nanoseconds, for binary search.
+        positions (dict): Column -> {label: ascending row positions}.
+    """
+    COLUMNS = ["Type", "Category", "Subcategory"]
+
+    def __init__(self, df: pd.DataFrame, columns: list = None):
+        Logger.info("Initializing LedgerIndex class.")
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index(kind='stable')
+        self.df : pd.DataFrame = df
+        self.dates : np.ndarray = df.index.values.astype('datetime64[ns]').view('int64')
+        self.positions : dict = {
+            column: df.groupby(column, observed=True, sort=False).indices
+            for column in (columns or self.COLUMNS) if column in df.columns
+        }
+
+    # Rows from the start of day start to the end of day end, both optional
+    def date_slice(self, start = None, end = None):
+        lo = 0 if start is None else int(np.searchsorted(self.dates, pd.Timestamp(start).normalize().value, side='left'))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, (pd.Timestamp(end).normalize() + pd.Timedelta(days=1)).value, side='left'))
+        return slice(lo, max(lo, hi))
+
+    # Any pd.Period string: "2025", "2025Q2", "2025-03", "2025-03-14"
+    def period_slice(self, period):
+        period = pd.Period(period)
+        return self.date_slice(period.start_time, period.end_time)
+
+    def label_positions(self, column: str, labels):
+        if column not in self.positions:
+            raise KeyError(f"{column} is not an indexed column of the ledger")
+        labels = [labels] if isinstance(labels, str) or not np.iterable(labels) else labels
+        empty = np.array([], dtype='int64')
+        arrays = [self.positions[column].get(label, empty) for label in labels]
+        return arrays[0] if len(arrays) == 1 else np.sort(np.concatenate(arrays))
+
+    # Row positions in the date range with every column filter matching, a
+    # filter is a label or a list of labels
+    def select_positions(self, start = None, end = None, period = None, **filters):
+        rows = self.period_slice(period) if period is not None else self.date_slice(start, end)
+        if not filters:
+            return np.arange(rows.start, rows.stop)
+
+        selected = None
+        for column, labels in filters.items():
+            positions = self.label_positions(column, labels)
+            # positions are ascending, so the date range is a sub-slice of them
+            positions = positions[np.searchsorted(positions, rows.start):np.searchsorted(positions, rows.stop)]
+            selected = positions if selected is None else np.intersect1d(selected, positions, assume_unique=True)
+        return selected
+
+    def select(self, start = None, end = None, period = None, **filters):
+        if not filters:
+            rows = self.period_slice(period) if period is not None else self.date_slice(start, end)
+            return self.df.iloc[rows]
+        return self.df.iloc[self.select_positions(start, end, period, **filters)]
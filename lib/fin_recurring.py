@@ -0,0 +1,115 @@
+import pandas as pd
+import numpy as np
+
+from .logger import Logger
+
+class FinRecurring:
+    """
+    Detection of recurring transactions (subscriptions, rent, salaries) in a
+    cashflow ledger of any number of years.
+
+    Transactions are grouped by a hashed signature of their normalized
+    description (lowercase, digits and punctuation dropped, so references and
+    dates inside descriptions do not matter) and the sign of the amount.
+    Within every signature the transactions are sorted by date and the
+    intervals between consecutive ones are tested against the known cadences,
+    all with grouped array statistics: there is no pairwise comparison.
+
+        df_ledger = load_ledger("cashflow", path)
+        df_recurring = FinRecurring(df_ledger).detect()
+
+    Attributes:
+        df (pd.DataFrame): The ledger, indexed by date.
+        min_occurrences (int): Transactions needed to call a signature recurring.
+        tolerance (float): Accepted deviation of an interval from a multiple of the cadence, as a fraction of it.
+        min_regularity (float): Share of the intervals that must be on cadence.
+    """
+    CADENCES = {"weekly": 7.0, "biweekly": 14.0, "monthly": 30.44, "quarterly": 91.31, "yearly": 365.25}
+
+    def __init__(self, df: pd.DataFrame, min_occurrences: int = 3, tolerance: float = 0.2, min_regularity: float = 0.75):
+        Logger.info("Initializing FinRecurring class.")
+        self.df : pd.DataFrame = df
+        self.min_occurrences : int = min_occurrences
+        self.tolerance : float = tolerance
+        self.min_regularity : float = min_regularity
+
+    # "NETFLIX.COM 12/03 REF 88123" -> "netflix com ref", computed once per distinct description
+    def normalize_descriptions(self, descriptions: pd.Series):
+        codes, uniques = pd.factorize(descriptions.astype(object).fillna('').astype(str), use_na_sentinel=False)
+        normalized = pd.Series(uniques).str.lower().str.replace(r'[\d\W_]+', ' ', regex=True).str.strip()
+        return normalized.values[codes]
+
+    def signatures(self):
+        df_key = pd.DataFrame({
+            "Description": self.normalize_descriptions(self.df["Description"]),
+            "Sign": np.sign(self.df["Qty"].values),
+        })
+        return pd.util.hash_pandas_object(df_key, index=False).values
+
+    # One row per recurring signature:
+    #   Cadence, Period (days), Count, First, Last, NextExpected
+    #   Regularity  share of the intervals that are a multiple of the period
+    #   Amount, AmountDrift, AmountDriftPct  mean amount, last - first amount
+    #   Missed      occurrences missing in the gaps of more than one period
+    #   Duplicates  occurrences closer than half a period to the previous one
+    def detect(self):
+        signatures = self.signatures()
+        dates = self.df.index.values.astype('datetime64[D]').astype('int64')
+        order = np.lexsort((dates, signatures))
+        signatures, dates = signatures[order], dates[order]
+        qty = self.df["Qty"].values[order]
+
+        # intervals between consecutive transactions of the same signature
+        same = signatures[1:] == signatures[:-1]
+        df_intervals = pd.DataFrame({"signature": signatures[1:][same], "days": np.diff(dates)[same].astype('float64')})
+        period_median = df_intervals.groupby("signature")["days"].median()
+
+        # nearest known cadence of the median interval, in log space
+        periods = np.array(list(self.CADENCES.values()))
+        distance = np.abs(np.log(np.maximum(period_median.values, 0.5)[:, None] / periods[None, :]))
+        cadence_idx = distance.argmin(axis=1)
+        cadence_ok = distance[np.arange(len(cadence_idx)), cadence_idx] <= np.log1p(self.tolerance)
+        df_cadence = pd.DataFrame({
+            "Cadence": np.array(list(self.CADENCES.keys()))[cadence_idx],
+            "Period": periods[cadence_idx],
+        }, index=period_median.index.rename("Signature")).loc[cadence_ok] # not "signature", the join column below
+
+        df_intervals = df_intervals.join(df_cadence, on="signature", how="inner")
+        ratio = df_intervals["days"].values / df_intervals["Period"].values
+        steps = np.rint(ratio)
+        df_intervals["on_cadence"] = (steps >= 1) & (np.abs(ratio - steps) <= self.tolerance)
+        df_intervals["missed"] = np.where(df_intervals["on_cadence"] & (steps > 1), steps - 1, 0)
+        df_intervals["duplicate"] = ratio < 0.5
+        df_stats = df_intervals.groupby("signature").agg(
+            Regularity=("on_cadence", "mean"), Missed=("missed", "sum"), Duplicates=("duplicate", "sum")
+        )
+
+        # per signature transaction statistics, boundaries of the sorted groups
+        starts = np.flatnonzero(np.r_[True, ~same][:len(signatures)]) # no group in an empty ledger
+        stops = np.r_[starts[1:], len(signatures)][:len(starts)]
+        df_groups = pd.DataFrame({
+            "Count": stops - starts,
+            "First": dates[starts].astype('datetime64[D]'),
+            "Last": dates[stops - 1].astype('datetime64[D]'),
+            "Amount": np.add.reduceat(qty, starts) / (stops - starts),
+            "FirstAmount": qty[starts],
+            "LastAmount": qty[stops - 1],
+            "row": order[starts],
+        }, index=signatures[starts])
+
+        df_recurring = df_groups.join(df_cadence, how="inner").join(df_stats, how="inner")
+        df_recurring = df_recurring.loc[
+            (df_recurring["Count"] >= self.min_occurrences) & (df_recurring["Regularity"] >= self.min_regularity)
+        ].copy()
+        df_recurring["AmountDrift"] = df_recurring["LastAmount"] - df_recurring["FirstAmount"]
+        df_recurring["AmountDriftPct"] = df_recurring["AmountDrift"] / df_recurring["FirstAmount"].abs()
+        df_recurring["NextExpected"] = df_recurring["Last"] + pd.to_timedelta(np.rint(df_recurring["Period"]), unit="D")
+
+        df_first_rows = self.df.iloc[df_recurring["row"].values]
+        df_recurring.insert(0, "Description", df_first_rows["Description"].values)
+        labels = [column for column in ("Type", "Category", "Subcategory") if column in self.df.columns]
+        for position, column in enumerate(labels, start=1):
+            df_recurring.insert(position, column, df_first_rows[column].astype(object).values)
+        df_recurring.index.name = "Signature"
+        Logger.info(f"Found {len(df_recurring)} recurring transactions")
+        return df_recurring.drop(columns=["row", "FirstAmount", "LastAmount"]).sort_values(["Cadence", "Amount"])
@@ -0,0 +1,148 @@
+import pandas as pd
+import numpy as np
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+
+class FinScenario:
+    """
+    A "what if" overlay of hypothetical transactions on top of a base
+    FinCashflow and/or FinInvestments, which are never copied nor modified.
+
+    A scenario only stores its own rows. Its tables are the tables of the
+    base shifted by the effect of those rows (see the incremental updates
+    of commonlib), so only the affected months and symbols are recomputed
+    and dozens of scenarios cost little more than their own rows.
+
+        rent_up = FinScenario(finCashflow, name="rent +10%").scale(1.10, start="2025-03-01", Subcategory="Rent")
+        etf = FinScenario(finCashflow, finInvest, name="buy ETF").buy("2025-03-15", "ETFs", "IE00B4L5Y983", 5, price=100.0, account="Hype")
+        compare_scenarios([rent_up, etf], "liquidity")
+
+    Attributes:
+        name (str): Name of the scenario, column label in comparisons.
+        cashflow (FinCashflow): Base cashflow, with run() done or not.
+        investments (FinInvestments): Base investments, with run() done.
+        df_cashflow_rows (pd.DataFrame): Hypothetical cashflow rows.
+        df_investments_rows (pd.DataFrame): Hypothetical investments rows.
+    """
+    def __init__(self, cashflow = None, investments = None, name: str = "scenario"):
+        Logger.info("Initializing FinScenario class.")
+        self.name : str = name
+        self.cashflow = cashflow
+        self.investments = investments
+        self.df_cashflow_rows : pd.DataFrame = None
+        self.df_investments_rows : pd.DataFrame = None
+
+    def check_base(self, typedata: str):
+        base = self.cashflow if typedata == "cashflow" else self.investments
+        if base is None:
+            raise ValueError(f"Scenario {self.name} has no base {typedata}")
+        if (typedata == "investments") and not hasattr(base, "df_holdings_monthlyized"):
+            raise ValueError("run() the base FinInvestments before layering scenarios on it")
+        return base
+
+    # Adds hypothetical rows (list of dicts or frame with the month file
+    # columns), returns the scenario so that calls can be chained
+    def add_transactions(self, rows, typedata: str = "cashflow"):
+        base = self.check_base(typedata)
+        df_new = ledger_rows(typedata, rows)
+        if (df_new.index.year != base.YEAR).any():
+            raise ValueError(f"Scenario transactions must all be of {base.YEAR}")
+        if typedata == "cashflow":
+            if base.fx is not None:
+                df_new = base.fx.convert(df_new)
+            if base.exact_cents:
+                df_new = add_cents(df_new)
+            rows_list = [df for df in (self.df_cashflow_rows, df_new) if df is not None]
+            self.df_cashflow_rows = concat_ledgers(rows_list)
+        else:
+            rows_list = [df for df in (self.df_investments_rows, df_new) if df is not None]
+            self.df_investments_rows = concat_ledgers(rows_list)
+        return self
+
+    # Scales the base cashflow rows selected like FinCashflow.query, e.g. rent
+    # +10% from March: scale(1.10, start="2025-03-01", Subcategory="Rent").
+    # Only the difference is layered, as rows on the same dates.
+    def scale(self, factor: float, start = None, end = None, period = None, **filters):
+        base = self.check_base("cashflow")
+        df_selected = base.query(start, end, period, **filters)
+        df_delta = df_selected.drop(columns=["Cents", "OrigQty", "OrigCoin"], errors="ignore").assign(Qty=df_selected["Qty"].values * (factor - 1.0))
+        df_delta["Description"] = f"{self.name}: x{factor}"
+        return self.add_transactions(df_delta, "cashflow")
+
+    # Buys (or sells, with Qty < 0) units of a symbol. With a price the cost
+    # also leaves account as an investment transfer of the cashflow.
+    def buy(self, date, Type: str, Symbol: str, Qty: float, price: float = None, account: str = None):
+        self.add_transactions([{
+            "Date": date, "Type": Type, "Symbol": Symbol, "Qty": Qty,
+            "Category": "Buy" if Qty > 0 else "Sell", "Subcategory": self.name, "Description": self.name,
+        }], "investments")
+        if price is not None and self.cashflow is not None:
+            if account is None:
+                raise ValueError("The account paying for the buy is needed with a price")
+            self.add_transactions([{
+                "Date": date, "Type": account, "Qty": -Qty * price, "Coin": "EUR",
+                "Category": "Transfer", "Subcategory": "Invest", "Description": f"{self.name}: {Symbol}",
+            }], "cashflow")
+        return self
+
+    def cents_to_float(self, df: pd.DataFrame):
+        return from_cents(df) if self.cashflow.exact_cents else df
+
+    def calc_monthly_cashflow(self):
+        base = self.check_base("cashflow")
+        df_m_cashflow = base.calc_monthly_cashflow() if base.df_m_cashflow.empty else base.df_m_cashflow
+        if self.df_cashflow_rows is None:
+            return df_m_cashflow
+        m_delta = flow_totals(self.df_cashflow_rows, base.amount, 'ME')
+        return apply_cashflow_deltas(df_m_cashflow, self.cents_to_float(m_delta))
+
+    def calc_balance_timeline(self):
+        base = self.check_base("cashflow")
+        if self.df_cashflow_rows is None:
+            return base.calc_balance_timeline()
+        df_daily_delta = daily_account_sums(self.df_cashflow_rows, base.amount)
+        return apply_balance_deltas(base.calc_balance_timeline(), self.cents_to_float(df_daily_delta))
+
+    def balance_as_of(self, date, account: str = None):
+        return balance_as_of(self.calc_balance_timeline(), date, account)
+
+    # Monthly holdings of get_holdings_monthlyized, plus the touched (asset class, symbol) pairs
+    def get_holdings_monthlyized(self):
+        base = self.check_base("investments")
+        if self.df_investments_rows is None:
+            return base.holdings_monthlyized, list()
+        complete_index = base.df_holdings_monthlyized.index
+        df_holdings, touched = apply_holdings_deltas(base.df_holdings_monthlyized, self.df_investments_rows, complete_index)
+        return holdings_dict(df_holdings), touched
+
+    # Holdings table of the base with the columns of the touched symbols recomputed
+    def get_total_holdings(self):
+        base = self.check_base("investments")
+        holdings_monthlyized, touched = self.get_holdings_monthlyized()
+        df_year_holdings = base.df_year_holdings.copy()
+        for asset_class, symbol in touched:
+            asset_history = base.assets_monthlyized.get(asset_class, dict()).get(symbol)
+            if asset_history is None:
+                Logger.warning(f"No prices of {symbol} in the base, left out of scenario {self.name}")
+                continue
+            assets = base.get_assets_global(
+                {asset_class: {symbol: asset_history}}, {asset_class: {symbol: holdings_monthlyized[asset_class][symbol]}}
+            )
+            df_year_holdings[symbol] = assets[asset_class][symbol]["Holdings"].reindex(df_year_holdings.index)
+        df_year_holdings['Total'] = df_year_holdings.drop(columns='Total').sum(axis=1)
+        return df_year_holdings
+
+
+# Side by side column of every scenario, e.g. "liquidity" of the monthly
+# cashflow or "Total" of the holdings table
+def compare_scenarios(scenarios, column: str = "liquidity"):
+    frames = dict()
+    for scenario in scenarios:
+        if column in CASHFLOW_SCHEMA:
+            frames[scenario.name] = scenario.calc_monthly_cashflow()[column]
+        else:
+            frames[scenario.name] = scenario.get_total_holdings()[column]
+    return pd.DataFrame(frames)
@@ -0,0 +1,147 @@
+from pathlib import Path
+import pandas as pd
+import json
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+from .fin_cache import file_fingerprint
+from .fin_cashflow import FinCashflow
+from .fin_investments import FinInvestments
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError: # pickle fallback, still a single read
+    feather = None
+
+class YearSnapshot:
+    """
+    The final tables of a closed year (df_m_cashflow, df_year_holdings and
+    the net worth table df_nw) stored together in one columnar file.
+
+    The three tables are laid side by side on the union of their dates, with
+    "{table}/{column}" columns and a "{table}/_row" mask to split them back.
+    Next to them the file metadata holds the fingerprints (size, mtime) of
+    every input of the year: month CSVs, exchange rates and prices and init json. A
+    snapshot whose fingerprints no longer match is ignored and rewritten.
+
+        frames = load_year_results(path, 2023) # tables of 2023, from the snapshot after the first call
+
+    Attributes:
+        year_path (Path): Data folder of the year.
+        snapshot_path (Path): Snapshot file, in {path}/{YEAR}/.snapshot/.
+        exact_cents (bool): The tables were computed in exact cents mode.
+    """
+    VERSION = 1 # bump when the layout of the tables changes
+    FRAMES = ("df_m_cashflow", "df_year_holdings", "df_nw")
+
+    def __init__(self, path: str, YEAR: int, exact_cents: bool = False):
+        ext = "feather" if feather is not None else "pkl"
+        mode = "_cents" if exact_cents else ""
+        self.year_path = Path(f"{path}/{YEAR}")
+        self.snapshot_path = self.year_path / ".snapshot" / f"{YEAR}_snapshot{mode}_v{self.VERSION}.{ext}"
+        self.YEAR : int = YEAR
+        self.exact_cents : bool = exact_cents
+
+    # relative path -> [size, mtime] of every input file of the year
+    def fingerprints(self):
+        filepaths = [self.year_path / f"{self.YEAR}_init.json"]
+        filepaths += sorted(self.year_path.glob("cashflow/*.csv"))
+        filepaths += sorted(self.year_path.glob("cashflow/exchange/*.csv"))
+        filepaths += sorted(self.year_path.glob("investments/*.csv"))
+        filepaths += sorted(self.year_path.glob("investments/exchange/*.csv"))
+        return {str(filepath.relative_to(self.year_path)): file_fingerprint(filepath) for filepath in filepaths if filepath.exists()}
+
+    def metadata(self):
+        return {
+            "YEAR": self.YEAR, "exact_cents": self.exact_cents, "fingerprints": self.fingerprints(),
+        }
+
+    def to_frame(self, frames: dict):
+        index = frames[self.FRAMES[0]].index
+        for name in self.FRAMES[1:]:
+            index = index.union(frames[name].index)
+        dfl = list()
+        for name in self.FRAMES:
+            df = frames[name].reindex(index)
+            df.columns = [f"{name}/{column}" for column in df.columns]
+            df[f"{name}/_row"] = index.isin(frames[name].index)
+            dfl.append(df)
+        df_snapshot = pd.concat(dfl, axis=1)
+        df_snapshot.index.name = "Date"
+        return df_snapshot
+
+    def from_frame(self, df_snapshot: pd.DataFrame):
+        frames = dict()
+        for name in self.FRAMES:
+            columns = [column for column in df_snapshot.columns if column.startswith(f"{name}/") and column != f"{name}/_row"]
+            df = df_snapshot.loc[df_snapshot[f"{name}/_row"].values, columns]
+            df.columns = [column[len(name)+1:] for column in columns]
+            df.index.name = None
+            frames[name] = df
+        return frames
+
+    # The tables if the snapshot exists and its inputs did not change, None otherwise
+    def load(self):
+        if not self.snapshot_path.exists():
+            return None
+        try:
+            if feather is not None:
+                table = feather.read_table(self.snapshot_path)
+                metadata = json.loads(table.schema.metadata[b"deepfinance"])
+                df_snapshot = table.to_pandas()
+            else:
+                df_snapshot = pd.read_pickle(self.snapshot_path)
+                metadata = df_snapshot.attrs["deepfinance"]
+        except Exception as e:
+            Logger.warning(f"Discarding unreadable snapshot {self.snapshot_path}: {e}")
+            return None
+        if metadata != json.loads(json.dumps(self.metadata())):
+            Logger.info(f"Inputs of {self.YEAR} changed, snapshot {self.snapshot_path} is stale")
+            return None
+        Logger.info(f"Tables of {self.YEAR} loaded from snapshot {self.snapshot_path}")
+        return self.from_frame(df_snapshot)
+
+    def save(self, frames: dict):
+        try:
+            self.snapshot_path.parent.mkdir(exist_ok=True)
+            df_snapshot = self.to_frame(frames)
+            metadata = self.metadata()
+            if feather is not None:
+                table = pa.Table.from_pandas(df_snapshot, preserve_index=True)
+                table = table.replace_schema_metadata({**table.schema.metadata, b"deepfinance": json.dumps(metadata)})
+                feather.write_feather(table, str(self.snapshot_path))
+            else:
+                df_snapshot.attrs["deepfinance"] = metadata
+                df_snapshot.to_pickle(self.snapshot_path)
+            Logger.info(f"Snapshot of {self.YEAR} saved to {self.snapshot_path}")
+        except Exception as e:
+            Logger.warning(f"Could not write snapshot {self.snapshot_path}: {e}")
+
+
+# df_m_cashflow, df_year_holdings and df_nw of a year. A closed year (before
+# the year of as_of) is read from its snapshot, computed and snapshotted
+# when missing or stale; the current year is always computed.
+def load_year_results(path: str, YEAR: int, exact_cents: bool = False, as_of = None):
+    as_of = resolve_as_of(as_of)
+    closed = YEAR < as_of.year
+    snapshot = YearSnapshot(path, YEAR, exact_cents)
+    if closed:
+        frames = snapshot.load()
+        if frames is not None:
+            return frames
+
+    finCashflow = FinCashflow(path, YEAR, exact_cents=exact_cents, as_of=as_of)
+    finCashflow.run()
+    finInvest = FinInvestments(path, YEAR, as_of=as_of)
+    finInvest.run()
+    frames = {
+        "df_m_cashflow": finCashflow.df_m_cashflow,
+        "df_year_holdings": finInvest.df_year_holdings,
+        "df_nw": build_net_worth(finCashflow.df_m_cashflow, finInvest.df_year_holdings),
+    }
+    if closed:
+        snapshot.save(frames)
+    return frames
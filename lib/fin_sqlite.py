@@ -0,0 +1,144 @@
+from pathlib import Path
+import pandas as pd
+import sqlite3
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+
+class LedgerDB:
+    """
+    A local SQLite store of the cashflow and investments ledgers.
+
+    Transactions are indexed on date, account Type, Category/Subcategory and
+    Symbol, so range queries, per-account sums and per-symbol histories run
+    as indexed SQL aggregates instead of masks over the whole ledger.
+
+    Attributes:
+        db_path (Path): Location of the SQLite database file.
+        conn (sqlite3.Connection): Open connection to the database.
+    """
+    COLUMNS = {
+        "cashflow": ["Date", "Type", "Qty", "Coin", "Category", "Subcategory", "Description"],
+        "investments": ["Date", "Type", "Symbol", "Qty", "Category", "Subcategory", "Description"],
+    }
+    INDEXES = {
+        "cashflow": [["Date"], ["Type", "Date"], ["Category", "Subcategory", "Date"]],
+        "investments": [["Date"], ["Symbol", "Date"], ["Type", "Symbol"]],
+    }
+
+    def __init__(self, path: str, filename: str = "ledger.sqlite"):
+        path_o = Path(path)
+        if not path_o.exists():
+            Logger.error("Wrong path!")
+            raise PathError(f"Entered path {path_o} does not exist! Cannot open ledger database.")
+
+        self.db_path = path_o / filename
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.create_schema()
+
+    def create_schema(self):
+        for typedata, columns in self.COLUMNS.items():
+            # Dates are ISO strings, so lexicographic order is chronological
+            column_defs = ", ".join(f"{c} REAL NOT NULL" if c == "Qty" else f"{c} TEXT NOT NULL DEFAULT ''" for c in columns)
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS {typedata} ({column_defs})")
+            for index_columns in self.INDEXES[typedata]:
+                index_name = f"idx_{typedata}_{'_'.join(index_columns).lower()}"
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {typedata} ({', '.join(index_columns)})")
+        self.conn.commit()
+
+    def check_typedata(self, typedata: str):
+        if typedata not in self.COLUMNS:
+            raise TypeDataError(f"Type data is not either cashflow or investments")
+
+    # Replaces the stored transactions of the given years with the CSV tree under path
+    def import_csv_tree(self, path: str, years = None, workers: int = 1):
+        years = list_years(path) if years is None else list(years)
+        for typedata, columns in self.COLUMNS.items():
+            for YEAR in years:
+                try:
+                    df = load_data(typedata, Path(path), YEAR, workers=workers)
+                except ValueError: # no month file for this year
+                    Logger.info(f"No {typedata} data to import for {YEAR}")
+                    continue
+                self.insert(typedata, df, replace_year=YEAR)
+                Logger.info(f"Imported {len(df)} {typedata} rows of {YEAR} into {self.db_path}")
+
+    # Inserts a date-indexed ledger frame, optionally replacing a whole year first
+    def insert(self, typedata: str, df: pd.DataFrame, replace_year: int = None):
+        self.check_typedata(typedata)
+        columns = self.COLUMNS[typedata]
+        df_rows = df.reset_index()
+        df_rows['Date'] = df_rows['Date'].dt.strftime('%Y-%m-%d')
+        df_rows = df_rows.reindex(columns=columns, fill_value='')
+
+        with self.conn: # single transaction
+            if replace_year is not None:
+                self.conn.execute(f"DELETE FROM {typedata} WHERE Date >= ? AND Date <= ?", (f"{replace_year}-01-01", f"{replace_year}-12-31"))
+            df_rows.to_sql(typedata, self.conn, if_exists="append", index=False)
+
+    # Date-indexed frame with the same schema as load_data
+    def query(self, typedata: str, start: str = None, end: str = None, **filters):
+        self.check_typedata(typedata)
+        columns = self.COLUMNS[typedata]
+        clauses, params = list(), list()
+        if start is not None:
+            clauses.append("Date >= ?"); params.append(str(start))
+        if end is not None:
+            clauses.append("Date <= ?"); params.append(str(end))
+        for column, value in filters.items():
+            if column not in columns:
+                raise KeyError(f"Unknown {typedata} column {column}")
+            clauses.append(f"{column} = ?"); params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        df = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM {typedata} {where} ORDER BY Date, rowid", self.conn, params=params)
+        df['Date'] = pd.to_datetime(df['Date'])
+        schema = LEDGER_SCHEMAS[typedata]
+        df = df.astype({c: t for c, t in schema.items() if c in df.columns})
+        return df.set_index('Date')
+
+    def load_year(self, typedata: str, YEAR: int):
+        return self.query(typedata, start=f"{YEAR}-01-01", end=f"{YEAR}-12-31")
+
+    # Amount column of the aggregates: int64 cents with cents=True, summed
+    # exactly in SQLite integer arithmetic, Qty otherwise
+    def amount_sql(self, cents: bool):
+        return "CAST(ROUND(Qty * 100) AS INTEGER)" if cents else "Qty"
+
+    # Day indexed incomes, liabilities and investments totals between start and
+    # end included, the cashflow engine resamples them to any frequency
+    def daily_cashflow_totals(self, start: str, end: str, cents: bool = False):
+        amount = self.amount_sql(cents)
+        df = pd.read_sql_query(f"""
+            SELECT substr(Date, 1, 10) AS Day,
+                SUM(CASE WHEN Category != 'Transfer' AND Qty > 0 THEN {amount} ELSE 0 END) AS incomes,
+                SUM(CASE WHEN Category != 'Transfer' AND Qty <= 0 THEN {amount} ELSE 0 END) AS liabilities,
+                SUM(CASE WHEN Category = 'Transfer' AND Subcategory = 'Invest' THEN {amount} ELSE 0 END) AS investments
+            FROM cashflow WHERE Date >= ? AND Date <= ?
+            GROUP BY Day ORDER BY Day
+        """, self.conn, params=(str(start), str(end)))
+        df.index = pd.DatetimeIndex(pd.to_datetime(df.pop('Day')))
+        return df.astype('int64' if cents else 'float64')
+
+    def account_sums(self, start: str = None, end: str = None, cents: bool = False):
+        df = pd.read_sql_query(
+            f"SELECT Type, SUM({self.amount_sql(cents)}) AS Qty FROM cashflow WHERE Date >= ? AND Date <= ? GROUP BY Type",
+            self.conn, params=(str(start or "0000-00-00"), str(end or "9999-99-99"))
+        )
+        return df.set_index('Type')['Qty']
+
+    # Transactions of one symbol with the running quantity, including what was held before start
+    def symbol_history(self, symbol: str, start: str = None, end: str = None):
+        df = self.query("investments", start=start, end=end, Symbol=symbol)
+        opening = 0.0
+        if start is not None:
+            opening = self.conn.execute(
+                "SELECT COALESCE(SUM(Qty), 0) FROM investments WHERE Symbol = ? AND Date < ?", (symbol, str(start))
+            ).fetchone()[0]
+        df['CumQty'] = opening + df['Qty'].cumsum()
+        return df
+
+    def close(self):
+        self.conn.close()
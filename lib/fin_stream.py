@@ -0,0 +1,118 @@
+from typing import Dict
+from pathlib import Path
+import pandas as pd
+import numpy as np
+
+from .logger import Logger
+
+from .commonlib import *
+from .errors import *
+
+class FinCashflowStream:
+    """
+    A bounded-memory variant of FinCashflow for very large ledgers.
+
+    Month files are read in chunks and every chunk is folded into per-month
+    totals and per-account sums, so memory depends on the number of accounts,
+    not on the number of transactions. Methods needing single transactions,
+    such as calc_expenses, are only available on FinCashflow.
+
+    Attributes:
+        init_holdings (dict): A dictionary to store initial holdings.
+        m_totals (pd.DataFrame): Per-month incomes, liabilities and investments totals.
+        d_totals (pd.DataFrame): The same per day, to cut the current month at as_of.
+        account_sums (pd.Series): Per-account sum of all transactions of the year.
+        df_m_cashflow (pd.DataFrame) : Table which resumes monthly data
+        exact_cents (bool): Fold the amounts as integer cents instead of float Qty.
+        as_of (datetime): Date the tables are evaluated at, the wall clock at init by default.
+    """
+    def __init__(self, path: str, YEAR: int, chunksize: int = 100_000, exact_cents: bool = False, as_of = None):
+        Logger.info("Initializing FinCashflowStream class.")
+        path_o = Path(path)
+        if path_o.exists():
+            self.path = path_o
+        else:
+            Logger.error("Wrong path!")
+            raise PathError(f"Entered path {path_o} does not exist! Cannot load files.")
+
+        self.YEAR : int = YEAR
+        self.chunksize : int = chunksize
+        self.exact_cents : bool = exact_cents
+        self.as_of : datetime = resolve_as_of(as_of)
+        self.init_holdings : Dict[str, float] = load_init_holdings(self.path, self.YEAR)
+        self.m_totals : pd.DataFrame = pd.DataFrame(
+            index=pd.date_range(start=f"{YEAR}-01-01", periods=12, freq='ME'),
+            data=0.0, columns=["incomes", "liabilities", "investments"]
+        )
+        self.d_totals : pd.DataFrame = pd.DataFrame(
+            index=pd.date_range(start=f"{YEAR}-01-01", end=f"{YEAR}-12-31", freq='D'),
+            data=0.0, columns=["incomes", "liabilities", "investments"]
+        )
+        self.account_sums : pd.Series = pd.Series(dtype='int64' if exact_cents else 'float64')
+        self.df_m_cashflow : pd.DataFrame = pd.DataFrame()
+        self.df_last_month_cashflow : pd.DataFrame = pd.DataFrame()
+        self.load()
+        pass
+
+    # Folds one chunk of transactions into the running totals
+    def fold_chunk(self, chunk : pd.DataFrame):
+        chunk = chunk.loc[chunk["Date"].dt.year == self.YEAR]
+        month = chunk["Date"].dt.month.values - 1
+        day = chunk["Date"].dt.dayofyear.values - 1
+        qty = chunk["Qty"].values
+        # cents are integers below 2**53, so the float64 bincount sums stay exact
+        amount = to_cents(qty) if self.exact_cents else qty
+        not_transfer = (chunk["Category"] != "Transfer").values
+        invest = ((chunk["Category"] == "Transfer") & (chunk["Subcategory"] == "Invest")).values
+
+        self.m_totals["incomes"] += np.bincount(month, weights=amount * (not_transfer & (qty > 0)), minlength=12)
+        self.m_totals["liabilities"] += np.bincount(month, weights=amount * (not_transfer & (qty <= 0)), minlength=12)
+        self.m_totals["investments"] += np.bincount(month, weights=amount * invest, minlength=12)
+        days = len(self.d_totals)
+        self.d_totals["incomes"] += np.bincount(day, weights=amount * (not_transfer & (qty > 0)), minlength=days)
+        self.d_totals["liabilities"] += np.bincount(day, weights=amount * (not_transfer & (qty <= 0)), minlength=days)
+        self.d_totals["investments"] += np.bincount(day, weights=amount * invest, minlength=days)
+
+        chunk_sums = pd.Series(amount, index=chunk["Type"].values).groupby(level=0, observed=True).sum()
+        self.account_sums = self.account_sums.add(chunk_sums, fill_value=0)
+
+    def load(self):
+        for i in range(1,13):
+            filepath = f"{self.path}/{self.YEAR}/cashflow/{self.YEAR}-{i:0=2}_cashflow.csv"
+            try:
+                for chunk in read_month_chunks("cashflow", filepath, self.chunksize):
+                    if not(chunk.empty):
+                        self.fold_chunk(chunk)
+            except Exception as e:
+                print(e)
+                continue
+
+    def get_all_balances(self):
+        return build_balances(self.account_sums, self.init_holdings, self.exact_cents)
+
+    def calc_monthly_cashflow(self):
+        end_date = define_end_date(self.YEAR, self.as_of)
+        m_totals = self.m_totals.loc[:end_date]
+        if self.exact_cents:
+            m_totals = m_totals.round().astype('int64')
+        return build_monthly_cashflow(m_totals["incomes"], m_totals["liabilities"], m_totals["investments"], self.init_holdings, self.YEAR, end_date, self.exact_cents)
+
+    def calc_curr_month_cashflow(self):
+        # the month of as_of up to as_of, rows dated after it are not known yet on that day
+        today_date_str, today_month_str, today = define_today_date(self.as_of)
+        if today.year == self.YEAR:
+            d_totals = self.d_totals.loc[f"{today.year}-{today.month:0=2}-01":today]
+            m_totals = d_totals.sum()
+        else: # nothing of this ledger falls in the current month
+            m_totals = pd.Series(0.0, index=self.m_totals.columns)
+        as_number = (lambda total: int(round(total))) if self.exact_cents else float
+        m_incomes = as_number(m_totals["incomes"])
+        m_liab = as_number(m_totals["liabilities"])
+        m_investments = as_number(m_totals["investments"])
+        return build_curr_month_cashflow(m_incomes, m_liab, m_investments, self.df_m_cashflow, today, self.exact_cents)
+
+    def run(self, as_of = None):
+        if as_of is not None:
+            self.as_of = resolve_as_of(as_of)
+        self.df_m_cashflow = self.calc_monthly_cashflow()
+        self.df_last_month_cashflow = self.calc_curr_month_cashflow()
@@ -1,7 +1,9 @@
 from pathlib import Path
 import pandas as pd
+import numpy as np
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # For market data web scraping
 import requests
@@ -64,23 +66,45 @@ class FinLoad:
             print(f"{path} does not exist.")
             return None
 
-    def load_cashflow(path: Path, YEAR: int, show_exceptions: bool = False):
+    def read_cashflow_month(filepath: str):
+        df = pd.read_csv(filepath, skipinitialspace=True, na_filter=False)
+        df.columns = df.columns.str.strip() # remove whitespaces from columns
+        df.Category = df.Category.str.strip()
+        df.Subcategory = df.Subcategory.str.strip()
+        df.Type = df.Type.str.strip()
+        df.Coin = df.Coin.str.strip()
+        return df
+
+    def read_investments_month(filepath: str):
+        df = pd.read_csv(filepath, skipinitialspace=True, na_filter=False)
+        df.columns = df.columns.str.strip() # remove whitespaces from columns
+        df.Category = df.Category.str.strip()
+        df.Subcategory = df.Subcategory.str.strip()
+        df.Type = df.Type.str.strip()
+        df.Symbol = df.Symbol.str.strip()
+        return df
+
+    # Reads the month files in order, on a thread pool when workers > 1.
+    # Files that cannot be read are returned as None.
+    def read_months(read_month, filepaths, show_exceptions: bool = False, workers: int = 1):
+        def read_task(filepath):
+            try:
+                return read_month(filepath)
+            except Exception as e:
+                if show_exceptions:
+                    print(e)
+                return None
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(read_task, filepaths))
+        return [read_task(filepath) for filepath in filepaths]
+
+    def load_cashflow(path: Path, YEAR: int, show_exceptions: bool = False, workers: int = 1):
         if path.exists():
-            dfl = list()
-            for i in range(1,13):
-                try:
-                    filepath = f"{path}/{YEAR}/cashflow/{YEAR}-{i:0=2}_cashflow.csv"
-                    df = pd.read_csv(filepath, skipinitialspace=True, na_filter=False)
-                except Exception as e:
-                    if show_exceptions:
-                        print(e)
-                    continue
-                df.columns = df.columns.str.strip() # remove whitespaces from columns
-                df.Category = df.Category.str.strip()
-                df.Subcategory = df.Subcategory.str.strip()
-                df.Type = df.Type.str.strip()
-                df.Coin = df.Coin.str.strip()
-                dfl.append(df)
+            filepaths = [f"{path}/{YEAR}/cashflow/{YEAR}-{i:0=2}_cashflow.csv" for i in range(1,13)]
+            dfl = FinLoad.read_months(FinLoad.read_cashflow_month, filepaths, show_exceptions, workers)
+            dfl = [df for df in dfl if df is not None]
             df_year_cashflow = pd.concat(dfl)
             df_year_cashflow['Date'] = pd.to_datetime(df_year_cashflow['Date'])
             df_year_cashflow.set_index('Date',inplace=True)
@@ -89,28 +113,11 @@ class FinLoad:
             print(f"{path} does not exist.")
             return None
 
-    def load_investments(path: Path, YEAR: int, show_exceptions: bool = False):
+    def load_investments(path: Path, YEAR: int, show_exceptions: bool = False, workers: int = 1):
         if path.exists():
-            dfl = list()
-            for i in range(1,13):
-                try:
-                    filepath = f"{path}/{YEAR}/investments/{YEAR}-{i:0=2}_investments.csv"
-                    df = pd.read_csv(filepath, skipinitialspace=True, na_filter=False)
-
-                    df.columns = df.columns.str.strip() # remove whitespaces from columns
-                    df.Category = df.Category.str.strip()
-                    df.Subcategory = df.Subcategory.str.strip()
-                    df.Type = df.Type.str.strip()
-                    df.Symbol = df.Symbol.str.strip()
-                    if df.empty:
-                        continue
-                    else:
-                        dfl.append(df)
-                except Exception as e:
-                    if show_exceptions:
-                        print(e)
-                    continue
-
+            filepaths = [f"{path}/{YEAR}/investments/{YEAR}-{i:0=2}_investments.csv" for i in range(1,13)]
+            dfl = FinLoad.read_months(FinLoad.read_investments_month, filepaths, show_exceptions, workers)
+            dfl = [df for df in dfl if df is not None and not df.empty]
             df_year_investments = pd.concat(dfl)
             df_year_investments['Date'] = pd.to_datetime(df_year_investments['Date'])
             df_year_investments.set_index('Date',inplace=True)
@@ -123,31 +130,16 @@ class FinLoad:
 class FinCalc:
     def calc_current_balance(df_year_cashflow, init_holdings):
         current_balances = dict()
-        accounts = df_year_cashflow['Type'].unique().tolist()
-        for cc in accounts:
-            if cc in init_holdings['liquidity_eur'].keys():
-                val = df_year_cashflow.loc[df_year_cashflow["Type"] == cc]['Qty'].sum() + init_holdings['liquidity_eur'][cc]
-                current_balances[cc] = round(float(val), 2)
-            else:
-                val = df_year_cashflow.loc[df_year_cashflow["Type"] == cc]['Qty'].sum()
-                current_balances[cc] = round(float(val), 2)
+        account_sums = df_year_cashflow.groupby("Type", sort=False, observed=True)['Qty'].sum()
+        for cc, val in account_sums.items():
+            val = val + init_holdings['liquidity_eur'].get(cc, 0)
+            current_balances[cc] = round(float(val), 2)
 
         return current_balances
     
     def calc_balance_last_day_previous_month(df_year_cashflow, init_holdings, YEAR: int):
-        current_balances = dict()
         df_year_cashflow = df_year_cashflow.loc[df_year_cashflow.index <= define_end_date(YEAR)]
-
-        accounts = df_year_cashflow['Type'].unique().tolist()
-        for cc in accounts:
-            if cc in init_holdings['liquidity_eur'].keys():
-                val = df_year_cashflow.loc[df_year_cashflow["Type"] == cc]['Qty'].sum() + init_holdings['liquidity_eur'][cc]
-                current_balances[cc] = round(float(val), 2)
-            else:
-                val = df_year_cashflow.loc[df_year_cashflow["Type"] == cc]['Qty'].sum()
-                current_balances[cc] = round(float(val), 2)
-
-        return current_balances
+        return FinCalc.calc_current_balance(df_year_cashflow, init_holdings)
 
     def calc_monthly_cashflow(df_year_cashflow, init_holdings, YEAR: int):
         end_date = define_end_date(YEAR)
@@ -185,15 +177,16 @@ class FinCalc:
         for cc, val in init_holdings['liquidity_eur'].items():
             init_liquidity += val
 
+        # NaN flows in the init row keep every column float64
         init_row = pd.DataFrame({
-            "incomes": ['-'],
-            "liabilities": ['-'],
+            "incomes": [np.nan],
+            "liabilities": [np.nan],
             "savings": [init_liquidity],
-            "saving_rate": ['-'],
-            "investments": [0]
-        }, index=[datetime(YEAR-1, 12, 31)])
+            "saving_rate": [np.nan],
+            "investments": [0.0]
+        }, index=[datetime(YEAR-1, 12, 31)], dtype='float64')
 
-        df_monthly_cashflow = pd.concat([init_row, df_m_cashflow])
+        df_monthly_cashflow = pd.concat([init_row, df_m_cashflow.astype('float64')])
         df_monthly_cashflow['liquidity'] = df_monthly_cashflow['savings'].values.cumsum() - df_monthly_cashflow['investments'].abs().values.cumsum()
 
         return df_monthly_cashflow
@@ -214,7 +207,7 @@ class FinCalc:
         try:
             m_savingrate  = float(m_savings / m_incomes     )
         except Exception as ZeroDivisionError:
-            m_savingrate = 0;
+            m_savingrate = 0.0
 
         row_today_cashflow = pd.DataFrame({
             "incomes": [m_incomes],
@@ -270,34 +263,35 @@ class FinInvestmentsGet:
         df_init_investments = pd.concat(rows)
         return df_init_investments
 
-    # For each symbol of each asset class, initializes the date index series
-    # as dates from january till december with zero values, and then updates it
-    # with imported values from df_year_investments
+    # Quantities at every month end from the last day of the previous year,
+    # for all symbols at once: one bincount over (month, symbol) cells, then
+    # a cumsum down the months. Same {asset class: {symbol: frame}} layout.
     def get_holdings_monthlyized(df_year_investments, YEAR: int):
         start_date = f"{YEAR-1}-12-31" # for init_holdings
         end_date = define_end_date(YEAR)
         complete_index = pd.date_range(start=start_date, end=end_date, freq='ME') # End of month
-        df_month_fill = pd.DataFrame(index=complete_index, data=0.0, columns=["Qty"], dtype='float64')
+
+        df_keys = pd.DataFrame({"Type": df_year_investments["Type"].astype(object).values, "Symbol": df_year_investments["Symbol"].astype(object).values})
+        keys = pd.MultiIndex.from_frame(df_keys)
+        symbols = keys.unique()
+        class_rank = pd.Index(df_keys["Type"].unique()).get_indexer(symbols.get_level_values(0))
+        symbols = symbols[np.argsort(class_rank, kind='stable')] # grouped by asset class, in order of appearance
+
+        months = pd.DatetimeIndex(df_year_investments.index.values.astype('datetime64[M]')) + pd.offsets.MonthEnd(0)
+        rows = complete_index.get_indexer(months)
+        cols = symbols.get_indexer(keys)
+        inside = (rows >= 0) & (cols >= 0)
+        qty = np.nan_to_num(df_year_investments["Qty"].values.astype('float64'))
+        m_qty = np.bincount(
+            rows[inside] * len(symbols) + cols[inside], weights=qty[inside], minlength=len(complete_index) * len(symbols)
+        ).reshape(len(complete_index), len(symbols))
+        m_cumqty = m_qty.cumsum(axis=0)
 
         holdings_monthlyized = dict()
-        asset_classes = df_year_investments["Type"].unique()
-        for asset_class in asset_classes:
-            holdings_monthlyized_per_symbol = dict()
-            symbols = df_year_investments.loc[df_year_investments["Type"]==asset_class]["Symbol"].unique()
-            for symbol in symbols:
-                df_year_investments_query_asset_class = df_year_investments.loc[ df_year_investments.Type == asset_class ]
-                df_symbol_transactions = df_year_investments_query_asset_class.loc[ df_year_investments_query_asset_class.Symbol == symbol ]
-                
-                # Monthlyized quantities to end of month
-                df_month_invest = df_symbol_transactions.resample(rule='ME')['Qty'].sum().to_frame(name='Qty')
-                
-                temp_fill = df_month_fill.copy()
-                temp_fill.update(df_month_invest)
-                temp_fill['CumQty'] = temp_fill.values.cumsum()
-                holdings_monthlyized_per_symbol[symbol] = temp_fill
-            
-            holdings_monthlyized[asset_class] = holdings_monthlyized_per_symbol
-        
+        for i, (asset_class, symbol) in enumerate(symbols):
+            holdings_monthlyized.setdefault(asset_class, dict())[symbol] = pd.DataFrame(
+                {"Qty": m_qty[:, i], "CumQty": m_cumqty[:, i]}, index=complete_index
+            )
         return holdings_monthlyized
 
     def get_current_holdings(df_year_investments, holdings_monthlyized):
@@ -68,6 +68,10 @@ class FinPlot:
             'Holiday':   '#FEFBD8',
             'Bills':     '#E7D4B5'
         }
+        # df_expenses can be the rows of calc_expenses or the already aggregated
+        # rows of calc_expense_breakdown, which sunburst sums much faster
+        # plotly express cannot aggregate over categorical label columns
+        df_expenses = df_expenses.astype({'Category': 'object', 'Subcategory': 'object'})
         fig = px.sunburst(
             df_expenses,
             path=['Category', 'Subcategory'],
@@ -82,6 +86,17 @@ class FinPlot:
         )
         return fig
 
+    def plot_expenses_trend(df_trend):
+        fig = go.Figure()
+        for label in df_trend.columns:
+            fig.add_trace(go.Bar(x=df_trend.index, y=df_trend[label], name=str(label)))
+        fig.update_layout(
+            title = dict(text="Expenses Trend", x=0.5, y=0.95),
+            barmode='stack', xaxis_tickangle=0,
+            width=1000, height=400,
+        )
+        return fig
+
     
     def plot_hist_expenses_month(df_months, months):
         specs = [[dict(type="domain") for i in range(3)] for j in range(4)]
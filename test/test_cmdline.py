@@ -45,9 +45,6 @@ def cmd_fullview(Year):
     fig = FinPlot.plot_expenses_donut(df_expenses)
     #fig.show()
 
-    init_holdings = FinLoad.load_init_holdings(data_path_o, Year)
-    df_year_investments = FinLoad.load_investments(data_path_o, Year)
-
     df_init_investments = FinInvestmentsGet.get_init_holdings_to_df(init_holdings, Year)
     df_year_investments = pd.concat([df_init_investments, df_year_investments])
     holdings_monthlyized = FinInvestmentsGet.get_holdings_monthlyized(df_year_investments, Year)